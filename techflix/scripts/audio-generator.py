@@ -5,66 +5,163 @@ Supports multiple TTS providers: Edge TTS, Google Gemini, ElevenLabs
 """
 
 import asyncio
+import hashlib
 import os
+import re
 import sys
 import json
+import math
 import time
+import uuid
+import random
+import signal
+import logging
+import threading
+import contextlib
 from pathlib import Path
 from typing import Dict, List, Optional
 import argparse
 
-# Edge TTS support
+# POSIX advisory locks for output directories shared between shards (not available on Windows)
 try:
-    import edge_tts
-    EDGE_TTS_AVAILABLE = True
+    import fcntl
 except ImportError:
-    EDGE_TTS_AVAILABLE = False
-    print("Warning: edge-tts not installed. Run: pip install edge-tts")
+    fcntl = None
 
-# Google Gemini support
-try:
-    from google import genai
-    from google.genai import types
-    import struct
-    GEMINI_AVAILABLE = True
-except ImportError:
-    GEMINI_AVAILABLE = False
-    print("Warning: google-generativeai not installed. Run: pip install google-generativeai")
+from tts_providers import (PROVIDERS, CassetteProvider, HedgePolicy, ProviderError, as_provider_error, audio_duration,
+                           get_provider, split_text, stitch_audio)
+from latency_stats import percentile
+
+# Per-provider request latencies and retry counts from previous runs, kept next to manifest.json
+STATS_FILE = "provider-stats.json"
+STATS_SAMPLES = 500
+# Attempt counters kept alongside the samples: every attempt, those retried, and those answered with 429
+ATTEMPT_COUNTS = ("requests", "retries", "rate_limited")
+
+# One JSON line per provider request, appended next to manifest.json; each shard appends to its own file
+EVENTS_FILE = "events.jsonl"
+SHARD_EVENTS = "events.shard-{index}-of-{count}.jsonl"
+
+# Retries for rate limits and transient errors, with exponential backoff from this many seconds
+RETRY_BACKOFF = 1.0
+
+# Written next to manifest.json by --profile
+PROFILE_FILE = "profile-{run}.json"
+CPROFILE_FILE = "profile-{run}.pstats"
+NO_STAGE = contextlib.nullcontext()
+
+# Generation daemon: local job API, with the job queue persisted next to manifest.json
+DAEMON_PORT = 8790
+DAEMON_JOBS_FILE = "daemon-jobs.json"
+DAEMON_HISTORY = 200
+
+# --shard i/N writes partial metadata and manifests next to the shared files; merge folds them in
+SHARD_METADATA = "metadata.shard-{index}-of-{count}.json"
+SHARD_MANIFEST = "manifest.shard-{index}-of-{count}.json"
+# Segments per episode synthesized before any episode's later segments (--openers)
+DEFAULT_OPENERS = 1
+
+# Runtime index of all generated audio, written next to manifest.json; segment URLs are relative to the base
+CATALOG_FILE = "catalog.json"
+CATALOG_MSGPACK_FILE = "catalog.msgpack"
+CATALOG_BASE_URL = "/audio/voiceovers/"
+
+# Lock file in the output directory serializing writers of the shared files across processes
+LOCK_FILE = ".generator.lock"
 
 # Load voiceover scripts from a centralized location
 VOICEOVER_SCRIPTS_PATH = Path(__file__).parent.parent / "src" / "content" / "voiceover-scripts.json"
 
+# Per-episode voiceover modules; src/episodes/season2/ep1-*/voiceovers/scripts.js is episode s2e1
+EPISODE_SOURCES_PATH = Path(__file__).parent.parent / "src" / "episodes"
+EPISODE_SCRIPTS_GLOB = "season*/ep*/voiceovers/scripts.js"
+EPISODE_DIR_RE = re.compile(r"^season(\d+)$|^ep(\d+)-")
+# Quoted JS string literals: group 2 is the id and group 4 the text of { id: '...', ..., text: "..." }
+JS_SEGMENT_RE = re.compile(r"""\bid:\s*(['"])((?:\\.|(?!\1)[^\\])*)\1[^{}]*?\btext:\s*(['"])((?:\\.|(?!\3)[^\\])*)\3""",
+                           re.S)
+JS_TITLE_RE = re.compile(r"""\btitle:\s*(['"])((?:\\.|(?!\1)[^\\])*)\1""")
+
+# --watch polls the scripts file and the episode voiceover modules, then waits for edits to settle
+WATCH_INTERVAL = 0.5
+WATCH_DEBOUNCE = 1.0
+
 class AudioGenerator:
     """Unified audio generator supporting multiple TTS providers"""
     
-    def __init__(self, provider: str = "edge"):
-        self.provider = provider.lower()
+    def __init__(self, provider: str = "edge", providers: Optional[List[str]] = None,
+                 concurrency: Optional[Dict[str, int]] = None, hedge: Optional[str] = None,
+                 hedge_options: Optional[Dict] = None, cassette: Optional[str] = None,
+                 cassette_mode: str = "replay", replay_speed: float = 1.0, split_over: Optional[int] = None,
+                 retries: int = 2, events: Optional[str] = None, shard: Optional[tuple] = None,
+                 catalog_msgpack: bool = False, schedule: Optional[Dict] = None):
+        names = list(dict.fromkeys(name.lower() for name in (providers or [provider])))
+        concurrency = concurrency or {}
+        self.provider = names[0]
         self.scripts = self._load_scripts()
         
-        # Provider configurations
-        self.edge_voices = {
-            "primary": {"voice": "en-US-GuyNeural", "rate": "-5%", "pitch": "-2Hz"},
-            "secondary": {"voice": "en-US-AriaNeural", "rate": "-3%", "pitch": "0Hz"},
-            "technical": {"voice": "en-US-ChristopherNeural", "rate": "-8%", "pitch": "-3Hz"},
-            "energetic": {"voice": "en-US-JennyNeural", "rate": "+5%", "pitch": "+2Hz"}
-        }
+        # Provider plugins, each with its own concurrency budget
+        self.providers = [get_provider(name, concurrency=concurrency.get(name)) for name in names]
         
-        self.gemini_voices = {
-            "narrator": "Zephyr",
-            "technical": "Charon",
-            "energetic": "Puck",
-            "friendly": "Kore",
-            "professional": "Aoede"
-        }
+        # (characters, seconds) for every completed request, by provider name
+        self.samples = {}
+        # ATTEMPT_COUNTS for every finished attempt, by provider name
+        self.attempts = {}
+        
+        # Segments longer than this are split into sentences synthesized in parallel
+        self.split_over = split_over
+        
+        self.retries = retries
+        # (index, count) from --shard: this process only handles segments whose hash falls in its shard
+        self.shard = shard
+        # Also write the catalog index as MessagePack
+        self.catalog_msgpack = catalog_msgpack
+        
+        # Which segments providers work on first: the opening segments of every episode, then episodes
+        # with the earliest deadline (seconds from the start of a run), then the --priority list
+        schedule = schedule or {}
+        self.openers = schedule.get("openers", DEFAULT_OPENERS)
+        self.episode_priority = list(schedule.get("episodes") or [])
+        self.deadlines = dict(schedule.get("deadlines") or {})
+        self.run_start = time.monotonic()
+        
+        # Structured request events; the file defaults to events.jsonl in the output directory
+        self.events_path = events
+        self.events = None
+        
+        # Set by --profile to time pipeline stages
+        self.profiler = None
+        
+        # Optional backup provider for slow requests ("name" or "name:ENV_VAR" for another API key)
+        self.hedge = None
+        self.hedge_policies = {}
+        if hedge:
+            name, _, key_env = hedge.partition(":")
+            api_key = os.environ.get(key_env) if key_env else None
+            self.hedge = get_provider(name, concurrency=concurrency.get(name.lower()), api_key=api_key)
+            self.hedge_policies = {provider.name: HedgePolicy(**(hedge_options or {})) for provider in self.providers}
+        
+        # Record provider traffic to a cassette directory, or replay it without network access
+        if cassette:
+            self.providers = [CassetteProvider(provider, cassette, cassette_mode, replay_speed)
+                              for provider in self.providers]
+            if self.hedge:
+                self.hedge = CassetteProvider(self.hedge, cassette, cassette_mode, replay_speed)
+            if cassette_mode == "replay":
+                # Rate limits are replayed at the same accelerated pace as the recorded timing
+                for engine in self.providers + ([self.hedge] if self.hedge else []):
+                    engine.limiter.min_interval = engine.min_interval / replay_speed if replay_speed else 0.0
     
     def _load_scripts(self) -> Dict:
-        """Load voiceover scripts from JSON file"""
+        """Load voiceover scripts from JSON file, plus the episodes' own voiceover modules"""
         # If scripts file doesn't exist, use the embedded scripts
         if not VOICEOVER_SCRIPTS_PATH.exists():
-            return self._get_default_scripts()
-        
-        with open(VOICEOVER_SCRIPTS_PATH) as f:
-            return json.load(f)
+            scripts = self._get_default_scripts()
+        else:
+            with open(VOICEOVER_SCRIPTS_PATH) as f:
+                scripts = json.load(f)
+        # An episode's scripts.js is where its narration is edited, so it wins over the JSON
+        scripts.update(load_episode_scripts())
+        return scripts
     
     def _get_default_scripts(self) -> Dict:
         """Return default embedded scripts"""
@@ -106,255 +203,1630 @@ class AudioGenerator:
             # Add other episodes here...
         }
     
-    async def generate_edge_tts(self, text: str, voice_config: dict, output_path: str) -> bool:
-        """Generate audio using Edge TTS"""
-        if not EDGE_TTS_AVAILABLE:
-            print("Edge TTS not available")
-            return False
+    def in_shard(self, episode_id: str, segment_id: str) -> bool:
+        """Whether this process owns a segment; every machine agrees without coordinating"""
+        if self.shard is None:
+            return True
+        index, count = self.shard
+        digest = hashlib.sha256(f"{episode_id}/{segment_id}".encode()).digest()
+        return int.from_bytes(digest[:8], 'big') % count == index - 1
+    
+    def shard_segments(self, episode_id: str) -> List[dict]:
+        return [segment for segment in self.scripts[episode_id]['segments'] if self.in_shard(episode_id, segment['id'])]
+    
+    def metadata_file(self, ep_output_dir: Path) -> Path:
+        """metadata.json, or this shard's partial metadata that merge folds into it"""
+        if self.shard is None:
+            return ep_output_dir / "metadata.json"
+        index, count = self.shard
+        return ep_output_dir / SHARD_METADATA.format(index=index, count=count)
+    
+    def recorded_metadata(self, ep_output_dir: Path) -> Optional[Dict]:
+        """metadata.json, overlaid with this shard's partial metadata that has not been merged yet"""
+        metadata = read_metadata(ep_output_dir / "metadata.json")
+        if self.shard is None:
+            return metadata
+        partial = read_metadata(self.metadata_file(ep_output_dir))
+        if not partial:
+            return metadata
+        if not metadata:
+            return partial
+        entries = {entry['id']: entry for entry in metadata.get('segments', []) if 'id' in entry}
+        entries.update((entry['id'], entry) for entry in partial.get('segments', []) if 'id' in entry)
+        return {**metadata, "segments": list(entries.values())}
+    
+    def segment_priority(self, episode_id: str, segment_id: str) -> tuple:
+        """Scheduling key for a segment's requests; providers serve the smallest key first.
+        
+        Episodes without a deadline or rank share a key prefix, so their segments are
+        interleaved by position and an interrupted run leaves every episode a playable start.
+        """
+        segments = [segment['id'] for segment in self.scripts.get(episode_id, {}).get('segments', [])]
+        index = segments.index(segment_id) if segment_id in segments else len(segments)
+        rank = (self.episode_priority.index(episode_id) if episode_id in self.episode_priority
+                else len(self.episode_priority))
+        return (index >= self.openers, self.deadlines.get(episode_id, math.inf), rank, index)
+    
+    def check_deadline(self, episode_id: str):
+        deadline = self.deadlines.get(episode_id)
+        if deadline is None:
+            return
+        elapsed = time.monotonic() - self.run_start
+        if elapsed > deadline:
+            print(f"   ⏰ {episode_id} finished {format_duration(elapsed - deadline)} past its {format_duration(deadline)} deadline")
+        else:
+            print(f"   ⏱️  {episode_id} finished within its {format_duration(deadline)} deadline")
+    
+    def episode_dir(self, provider, episode_id: str) -> str:
+        """Output directory name for one episode; multi-provider runs get a provider suffix"""
+        if len(self.providers) > 1:
+            return f"{episode_id}-{provider.name}"
+        return episode_id
+    
+    async def generate_segment(self, provider, episode_id: str, segment: dict, ep_output_dir: Path) -> Optional[dict]:
+        """Synthesize one segment within the provider's concurrency budget"""
+        segment_id = segment['id']
+        text = segment['text']
+        priority = self.segment_priority(episode_id, segment_id)
         
         try:
-            communicate = edge_tts.Communicate(
-                text,
-                voice_config["voice"],
-                rate=voice_config.get("rate", "-5%"),
-                pitch=voice_config.get("pitch", "0Hz")
-            )
-            
-            os.makedirs(os.path.dirname(output_path), exist_ok=True)
-            await communicate.save(output_path)
-            return True
+            engine, voice_type, voice_config, audio = await self.synthesize(provider, f"{episode_id}/{segment_id}", segment_id,
+                                                                            text, priority)
+        except ProviderError as e:
+            print(f"   ❌ {episode_id}/{segment_id} ({provider.name}): {e}")
+            return None
         except Exception as e:
-            print(f"Edge TTS Error: {str(e)}")
-            return False
+            print(f"   ❌ {episode_id}/{segment_id} ({provider.name}): {provider.label} Error: {e}")
+            return None
+        
+        # Output file; a hedged segment keeps the format of the provider that produced it
+        output_file = ep_output_dir / f"{segment_id}.{engine.extension}"
+        # Replaced atomically: the dev server memory-maps audio, and rewriting a
+        # mapped file in place truncates the pages it is still sending
+        with self.stage("audio_write"):
+            write_bytes_atomic(output_file, audio)
+        print(f"   🎤 {episode_id}/{segment_id} ({engine.name}, {voice_type}) ✅")
+        duration = audio_duration(engine.extension, audio)
+        entry = {
+            "id": segment_id,
+            "file": output_file.name,
+            "text": text,
+            "voice": voice_type,
+            "settings": voice_config,
+            # Recorded for the catalog index, so it does not have to read the audio back
+            "bytes": len(audio),
+            "duration": round(duration, 3) if duration else None,
+            "hash": audio_hash(audio)
+        }
+        if engine is not provider:
+            entry["provider"] = engine.name
+        return entry
     
-    def generate_gemini(self, text: str, voice_name: str, output_path: str) -> bool:
-        """Generate audio using Google Gemini"""
-        if not GEMINI_AVAILABLE:
-            print("Gemini not available")
-            return False
+    async def attempt(self, provider, label: str, segment_id: str, text: str,
+                      started: Optional[asyncio.Event] = None, priority: tuple = ()) -> tuple:
+        """Synthesize one segment with one provider; returns (provider, voice_type, voice_config, audio)"""
+        # Select voice once for the whole segment so every chunk shares the same prosody settings
+        voice_type, voice_config = provider.select_voice(segment_id, text)
         
-        api_key = os.environ.get("GEM_KEY") or os.environ.get("GEMINI_API_KEY")
-        if not api_key:
-            print("Gemini API key not set. Use: export GEM_KEY='your-key'")
-            return False
+        chunks = split_text(text, provider.max_chars, self.split_over)
+        event = {"segment": label, "provider": provider.name, "voice": voice_type}
+        if provider is self.hedge:
+            event["hedge"] = True
+        if len(chunks) == 1:
+            audio = await self.request(provider, event, text, voice_config, started, priority)
+            return provider, voice_type, voice_config, audio
         
+        # Long segments: sentences run in parallel within the provider's budget, then are joined
+        tasks = [asyncio.create_task(self.request(provider, {**event, "chunk": i}, chunk, voice_config, started, priority))
+                 for i, chunk in enumerate(chunks)]
         try:
-            client = genai.Client(api_key=api_key)
-            
-            contents = [
-                types.Content(
-                    role="user",
-                    parts=[types.Part.from_text(text=text)]
-                )
-            ]
-            
-            config = types.GenerateContentConfig(
-                temperature=0.7,
-                response_modalities=["audio"],
-                speech_config=types.SpeechConfig(
-                    voice_config=types.VoiceConfig(
-                        prebuilt_voice_config=types.PrebuiltVoiceConfig(
-                            voice_name=voice_name
-                        )
-                    )
-                )
-            )
-            
-            # Generate audio
-            for chunk in client.models.generate_content_stream(
-                model="gemini-2.0-flash-preview-tts",
-                contents=contents,
-                config=config,
-            ):
-                if (chunk.candidates and 
-                    chunk.candidates[0].content and 
-                    chunk.candidates[0].content.parts and
-                    chunk.candidates[0].content.parts[0].inline_data):
-                    
-                    inline_data = chunk.candidates[0].content.parts[0].inline_data
-                    audio_data = self._convert_to_wav(inline_data.data, inline_data.mime_type)
-                    
-                    os.makedirs(os.path.dirname(output_path), exist_ok=True)
-                    with open(output_path, 'wb') as f:
-                        f.write(audio_data)
-                    
-                    return True
-            
-            return False
-            
-        except Exception as e:
-            print(f"Gemini Error: {str(e)}")
-            return False
-    
-    def _convert_to_wav(self, audio_data: bytes, mime_type: str) -> bytes:
-        """Convert audio data to WAV format"""
-        # Extract sample rate from mime type
-        rate = 24000
-        if mime_type:
-            parts = mime_type.split(";")
-            for param in parts:
-                if param.strip().lower().startswith("rate="):
-                    try:
-                        rate = int(param.split("=", 1)[1])
-                    except:
-                        pass
-        
-        # Create WAV header
-        num_channels = 1
-        bits_per_sample = 16
-        data_size = len(audio_data)
-        bytes_per_sample = bits_per_sample // 8
-        block_align = num_channels * bytes_per_sample
-        byte_rate = rate * block_align
-        chunk_size = 36 + data_size
-        
-        header = struct.pack(
-            "<4sI4s4sIHHIIHH4sI",
-            b"RIFF", chunk_size, b"WAVE", b"fmt ", 16, 1,
-            num_channels, rate, byte_rate, block_align,
-            bits_per_sample, b"data", data_size
-        )
-        return header + audio_data
-    
-    def select_voice(self, segment_id: str, text: str) -> tuple:
-        """Select appropriate voice based on content"""
-        if self.provider == "edge":
-            if "intro" in segment_id or "conclusion" in segment_id:
-                return "primary", self.edge_voices["primary"]
-            elif "technical" in text.lower() or "metrics" in segment_id:
-                return "technical", self.edge_voices["technical"]
-            elif "demo" in segment_id or "action" in text.lower():
-                return "energetic", self.edge_voices["energetic"]
-            else:
-                return "primary", self.edge_voices["primary"]
-        
-        else:  # Gemini
-            if "intro" in segment_id or "conclusion" in segment_id:
-                return "narrator", self.gemini_voices["narrator"]
-            elif "technical" in text.lower() or "architecture" in segment_id:
-                return "technical", self.gemini_voices["technical"]
-            elif "demo" in segment_id or "action" in text.lower():
-                return "energetic", self.gemini_voices["energetic"]
-            else:
-                return "narrator", self.gemini_voices["narrator"]
+            parts = await asyncio.gather(*tasks)
+        except BaseException:
+            for task in tasks:
+                task.cancel()
+            raise
+        with self.stage("stitch"):
+            return provider, voice_type, voice_config, stitch_audio(provider.extension, parts)
+    
+    async def request(self, provider, event: dict, text: str, voice_config,
+                      started: Optional[asyncio.Event] = None, priority: tuple = ()) -> bytes:
+        """One request within the provider's concurrency budget, retrying rate limits and transient errors"""
+        for retry in range(self.retries + 1):
+            queued = time.monotonic()
+            async with provider.limiter.slot(priority):
+                if started:
+                    started.set()
+                begin = time.monotonic()
+                attempt = {**event, "chars": len(text), "retries": retry, "queue_wait": begin - queued}
+                if self.profiler:
+                    self.profiler.add("queue_wait", begin - queued)
+                try:
+                    audio, ttfb = await self.fetch(provider, text, voice_config, begin)
+                except asyncio.CancelledError:
+                    self.log_event(attempt, begin, "cancelled")
+                    raise
+                except Exception as e:
+                    error = as_provider_error(e)
+                    retrying = error.retryable and retry < self.retries
+                    self.count_attempt(provider, retrying, error.status)
+                    self.log_event(attempt, begin, "retry" if retrying else "error", error=str(error),
+                                   status=error.status)
+                    if not retrying:
+                        raise error
+                else:
+                    self.count_attempt(provider)
+                    self.samples.setdefault(provider.name, []).append((len(text), time.monotonic() - begin))
+                    self.log_event(attempt, begin, "ok", ttfb=ttfb, bytes=len(audio))
+                    return audio
+            # Back off outside the limiter so the slot goes to other requests meanwhile
+            await asyncio.sleep(RETRY_BACKOFF * 2 ** retry * random.uniform(0.5, 1.0))
+    
+    async def fetch(self, provider, text: str, voice_config, begin: float) -> tuple:
+        """Read the provider's stream; returns (audio, seconds to first byte)"""
+        parts = []
+        ttfb = None
+        # Concurrent requests overlap, so this stage's wall time is summed across them
+        with self.stage("provider_request"):
+            async for chunk in provider.stream(text, voice_config):
+                if ttfb is None:
+                    ttfb = time.monotonic() - begin
+                parts.append(chunk)
+        if not parts:
+            raise ProviderError(f"{provider.label} returned no audio")
+        with self.stage("finalize"):
+            return provider.finalize(b"".join(parts)), ttfb
+    
+    def stage(self, name: str):
+        return self.profiler.stage(name) if self.profiler else NO_STAGE
+    
+    def count_attempt(self, provider, retried: bool = False, status: Optional[int] = None):
+        counts = self.attempts.setdefault(provider.name, dict.fromkeys(ATTEMPT_COUNTS, 0))
+        counts['requests'] += 1
+        counts['retries'] += retried
+        counts['rate_limited'] += status == 429
+    
+    def log_event(self, event: dict, begin: float, outcome: str, **fields):
+        if self.events is None:
+            return
+        event = {**event, "latency": time.monotonic() - begin, "outcome": outcome,
+                 **{key: value for key, value in fields.items() if value is not None}}
+        for key in ("queue_wait", "ttfb", "latency"):
+            if key in event:
+                event[key] = round(event[key], 4)
+        self.events.write(event)
+    
+    def open_events(self, output_dir: str):
+        self.events = EventLog(self.events_path or events_file(output_dir, self.shard))
+    
+    def close_events(self):
+        if self.events:
+            self.events.close()
+            self.events = None
+    
+    async def synthesize(self, provider, label: str, segment_id: str, text: str, priority: tuple = ()) -> tuple:
+        """Synthesize one segment, hedging to the backup provider when the primary is slow"""
+        policy = self.hedge_policies.get(provider.name)
+        if policy is None:
+            return await self.attempt(provider, label, segment_id, text, priority=priority)
+        
+        # The deadline covers the request itself, not time queued behind the concurrency budget
+        started = asyncio.Event()
+        primary = asyncio.create_task(self.attempt(provider, label, segment_id, text, started, priority))
+        waiter = asyncio.create_task(started.wait())
+        await asyncio.wait({primary, waiter}, return_when=asyncio.FIRST_COMPLETED)
+        waiter.cancel()
+        
+        policy.start(len(text))
+        begin = time.monotonic()
+        deadline = policy.deadline()
+        done, _ = await asyncio.wait({primary}, timeout=deadline)
+        if done or not policy.allow(len(text)):
+            result = await primary
+            policy.observe(time.monotonic() - begin)
+            return result
+        
+        print(f"   ⏱️  {label}: {provider.name} slower than {deadline:.1f}s, hedging to {self.hedge.name}")
+        backup = asyncio.create_task(self.attempt(self.hedge, label, segment_id, text, priority=priority))
+        pending = {primary, backup}
+        error = None
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is not None:
+                    error = task.exception()
+                    continue
+                # Keep the first success and cancel the other request
+                for loser in pending:
+                    loser.cancel()
+                # A lost primary still ran at least this long, which keeps the deadline honest
+                policy.observe(time.monotonic() - begin)
+                if task is backup:
+                    policy.won += 1
+                return task.result()
+        raise error
+    
+    async def generate_episode(self, provider, episode_id: str, output_dir: str) -> tuple:
+        """Generate every segment of one episode for one provider; returns (generated, errors)"""
+        # Create output directory
+        ep_output_dir = Path(output_dir) / self.episode_dir(provider, episode_id)
+        ep_output_dir.mkdir(parents=True, exist_ok=True)
+        
+        segments = self.shard_segments(episode_id)
+        if self.shard and not segments:
+            return 0, 0
+        
+        # Entries from earlier runs still describe the audio on disk until this run replaces them
+        metadata_file = self.metadata_file(ep_output_dir)
+        entries = {entry['id']: entry for entry in (read_metadata(metadata_file) or {}).get('segments', [])
+                   if 'id' in entry}
+        
+        async def generate(segment):
+            entry = await self.generate_segment(provider, episode_id, segment, ep_output_dir)
+            if entry:
+                entries[entry['id']] = entry
+                # Saved as each segment lands, so an interrupted run leaves the finished segments playable
+                self.save_episode_metadata(provider, episode_id, metadata_file, segments, entries)
+            return entry
+        
+        results = await asyncio.gather(*(generate(segment) for segment in segments))
+        self.check_deadline(episode_id)
+        
+        self.save_episode_metadata(provider, episode_id, metadata_file, segments, entries)
+        print(f"   📋 Metadata saved: {metadata_file}")
+        
+        generated = sum(1 for entry in results if entry)
+        return generated, len(results) - generated
+    
+    def save_episode_metadata(self, provider, episode_id: str, metadata_file: Path, segments: List[dict],
+                              entries: Dict[str, dict]):
+        """Episode metadata, in script order regardless of completion order"""
+        metadata = {
+            "episode_id": episode_id,
+            "title": self.scripts[episode_id]['title'],
+            "generated": time.strftime("%Y-%m-%d %H:%M:%S"),
+            "provider": provider.label,
+            "segments": [entries[segment['id']] for segment in segments if segment['id'] in entries]
+        }
+        if self.shard:
+            metadata['shard'] = "{}/{}".format(*self.shard)
+        with self.stage("metadata_write"):
+            write_json_atomic(metadata_file, metadata)
+    
+    async def generate_provider(self, provider, episodes: List[str], output_dir: str) -> dict:
+        """Generate all episodes for one provider, bounded by its own limiter"""
+        start_time = time.time()
+        counts = await asyncio.gather(*(
+            self.generate_episode(provider, episode_id, output_dir) for episode_id in episodes
+        ))
+        return {
+            "generated": sum(generated for generated, _ in counts),
+            "errors": sum(errors for _, errors in counts),
+            "concurrency": provider.concurrency,
+            "duration": f"{time.time() - start_time:.1f}s"
+        }
     
     async def generate_all(self, episodes: Optional[List[str]] = None, output_dir: str = "public/audio/voiceovers"):
         """Generate all voiceovers for specified episodes"""
         if episodes is None:
             episodes = list(self.scripts.keys())
         
-        print(f"🎙️ {self.provider.upper()} TTS - Audio Generation")
+        print(f"🎙️ {', '.join(provider.label for provider in self.providers)} - Audio Generation")
         print("=" * 60)
         
-        total_segments = sum(len(self.scripts[ep]['segments']) for ep in episodes if ep in self.scripts)
+        for episode_id in episodes:
+            if episode_id not in self.scripts:
+                print(f"❌ Episode {episode_id} not found in scripts")
+        episodes = [episode_id for episode_id in episodes if episode_id in self.scripts]
+        
+        for provider in self.providers:
+            problem = provider.check()
+            if problem:
+                print(f"⚠️  {provider.label}: {problem}")
+            limits = provider.limits()
+            print(f"🔌 {provider.label}: concurrency {limits['concurrency']}, "
+                  f"max {limits['max_chars']} chars, {limits['min_interval']}s between requests")
+        if self.hedge:
+            problem = self.hedge.check()
+            if problem:
+                print(f"⚠️  Hedging disabled, {self.hedge.label}: {problem}")
+                self.hedge_policies = {}
+            else:
+                policy = next(iter(self.hedge_policies.values()))
+                print(f"🪂 Hedging slow requests to {self.hedge.label} after p{policy.percentile:g} latency, "
+                      f"up to {policy.budget:.0%} extra characters")
+        
+        episode_segments = sum(len(self.shard_segments(ep)) for ep in episodes)
+        total_segments = episode_segments * len(self.providers)
         print(f"📊 Total segments to generate: {total_segments}")
+        if self.shard:
+            print(f"🧩 Shard {self.shard[0]}/{self.shard[1]}: partial metadata until merge")
         
-        generated = 0
-        errors = 0
         start_time = time.time()
+        self.run_start = time.monotonic()
         
-        for episode_id in episodes:
-            if episode_id not in self.scripts:
-                print(f"❌ Episode {episode_id} not found in scripts")
-                continue
-            
-            episode_data = self.scripts[episode_id]
-            print(f"\n📺 Episode: {episode_id} - {episode_data['title']}")
-            
-            # Create output directory
-            ep_output_dir = Path(output_dir) / episode_id
-            ep_output_dir.mkdir(parents=True, exist_ok=True)
-            
-            # Episode metadata
-            metadata = {
-                "episode_id": episode_id,
-                "title": episode_data['title'],
-                "generated": time.strftime("%Y-%m-%d %H:%M:%S"),
-                "provider": self.provider.upper() + " TTS",
-                "segments": []
-            }
-            
-            for segment in episode_data['segments']:
-                segment_id = segment['id']
-                text = segment['text']
-                
-                # Select voice
-                voice_type, voice_config = self.select_voice(segment_id, text)
-                
-                # Output file
-                extension = "mp3" if self.provider == "edge" else "wav"
-                output_file = ep_output_dir / f"{segment_id}.{extension}"
-                
-                print(f"   🎤 {segment_id} ({voice_type})...", end="", flush=True)
-                
-                # Generate audio
-                success = False
-                if self.provider == "edge":
-                    success = await self.generate_edge_tts(text, voice_config, str(output_file))
-                elif self.provider == "gemini":
-                    success = self.generate_gemini(text, voice_config, str(output_file))
-                
-                if success:
-                    print(" ✅")
-                    generated += 1
-                    metadata['segments'].append({
-                        "id": segment_id,
-                        "file": f"{segment_id}.{extension}",
-                        "text": text,
-                        "voice": voice_type
-                    })
-                else:
-                    print(" ❌")
-                    errors += 1
-                
-                # Rate limiting for API providers
-                if self.provider == "gemini":
-                    time.sleep(1)
-            
-            # Save metadata
-            metadata_file = ep_output_dir / "metadata.json"
-            with open(metadata_file, 'w') as f:
-                json.dump(metadata, f, indent=2)
-            print(f"   📋 Metadata saved: {metadata_file}")
+        # Providers run side by side; each is throttled only by its own budget
+        Path(output_dir).mkdir(parents=True, exist_ok=True)
+        self.open_events(output_dir)
+        try:
+            results = await asyncio.gather(*(
+                self.generate_provider(provider, episodes, output_dir) for provider in self.providers
+            ))
+        finally:
+            self.close_events()
+        statistics = {provider.name: stats for provider, stats in zip(self.providers, results)}
+        for name, policy in self.hedge_policies.items():
+            statistics[name].update(policy.stats())
+        generated = sum(stats['generated'] for stats in results)
+        errors = sum(stats['errors'] for stats in results)
         
         # Create master manifest
         manifest = {
             "generated": time.strftime("%Y-%m-%d %H:%M:%S"),
-            "provider": self.provider.upper() + " TTS",
+            "provider": ", ".join(provider.label for provider in self.providers),
             "statistics": {
                 "total_segments": total_segments,
                 "generated": generated,
                 "errors": errors,
-                "duration": f"{time.time() - start_time:.1f}s"
+                "duration": f"{time.time() - start_time:.1f}s",
+                "providers": statistics
             },
-            "episodes": episodes
+            "episodes": [self.episode_dir(provider, episode_id)
+                         for provider in self.providers for episode_id in episodes]
         }
         
         manifest_file = Path(output_dir) / "manifest.json"
-        with open(manifest_file, 'w') as f:
-            json.dump(manifest, f, indent=2)
+        if self.shard:
+            manifest['shard'] = "{}/{}".format(*self.shard)
+            manifest_file = Path(output_dir) / SHARD_MANIFEST.format(index=self.shard[0], count=self.shard[1])
+        with self.stage("manifest_write"):
+            write_json_atomic(manifest_file, manifest)
+        save_stats(output_dir, self.samples, self.attempts)
+        with output_lock(output_dir):
+            self.write_catalog(output_dir)
         
         # Summary
         print(f"\n{'='*60}")
         print(f"✅ Generation Complete!")
         print(f"   Total: {generated}/{total_segments} segments")
         print(f"   Errors: {errors}")
+        for name, stats in statistics.items():
+            print(f"   {name}: {stats['generated']} generated, {stats['errors']} errors in {stats['duration']}")
+            if 'hedged' in stats:
+                print(f"   {name}: {stats['hedged']} hedged, {stats['hedge_wins']} won by {self.hedge.name}")
         print(f"   Time: {time.time() - start_time:.1f}s")
         print(f"   Output: {output_dir}")
+        return manifest['statistics']
+    
+    def close(self):
+        for provider in self.providers + ([self.hedge] if self.hedge else []):
+            provider.close()
+    
+    def engine(self, name: Optional[str], provider):
+        """Provider instance that produced a metadata entry (the hedge provider for hedged segments)"""
+        if name and self.hedge and name == self.hedge.name and name != provider.name:
+            return self.hedge
+        return provider
+    
+    def segment_change(self, provider, ep_output_dir: Path, segment: dict, entry: Optional[dict]) -> Optional[str]:
+        """Why a recorded metadata entry no longer matches a script segment, or None if it is current"""
+        if entry is None:
+            return "new segment"
+        engine = self.engine(entry.get('provider'), provider)
+        voice_type, voice_config = engine.select_voice(segment['id'], segment['text'])
+        if entry.get('text') != segment['text']:
+            return "text changed"
+        if entry.get('voice') != voice_type:
+            return "voice changed"
+        # Entries written before voice settings were recorded only carry the voice type
+        if 'settings' in entry and entry['settings'] != voice_config:
+            return "voice settings changed"
+        if not entry.get('file') or not (ep_output_dir / entry['file']).is_file():
+            return "audio missing"
+        return None
+    
+    def plan(self, episodes: Optional[List[str]] = None, output_dir: str = "public/audio/voiceovers") -> List[dict]:
+        """Compare the scripts with each metadata.json and list the actions needed to bring audio up to date"""
+        if episodes is None:
+            episodes = list(self.scripts.keys())
+        
+        actions = []
+        for provider in self.providers:
+            for episode_id in episodes:
+                if episode_id not in self.scripts:
+                    print(f"❌ Episode {episode_id} not found in scripts")
+                    continue
+                
+                ep_output_dir = Path(output_dir) / self.episode_dir(provider, episode_id)
+                recorded = self.recorded_metadata(ep_output_dir) or {}
+                entries = {entry['id']: entry for entry in recorded.get('segments', []) if 'id' in entry}
+                segments = self.scripts[episode_id]['segments']
+                wanted = {segment['id'] for segment in segments}
+                stale = {segment_id: entry for segment_id, entry in entries.items() if segment_id not in wanted}
+                base = {"provider": provider.name, "episode": episode_id}
+                
+                for segment in segments:
+                    reason = self.segment_change(provider, ep_output_dir, segment, entries.get(segment['id']))
+                    if reason is None:
+                        continue
+                    
+                    # Audio for a removed segment with the same text and voice is reused under the new id
+                    source = next((old_id for old_id, entry in stale.items()
+                                   if self.segment_change(provider, ep_output_dir, segment, entry) is None), None)
+                    if source:
+                        del stale[source]
+                        actions.append({**base, "action": "rename", "segment": segment['id'], "from": source})
+                    else:
+                        actions.append({**base, "action": "synthesize", "segment": segment['id'],
+                                        "reason": reason, "chars": len(segment['text'])})
+                
+                for segment_id in stale:
+                    actions.append({**base, "action": "delete", "segment": segment_id})
+        # Every shard computes the same plan and keeps the actions for the segments it owns
+        return [action for action in actions if self.in_shard(action['episode'], action['segment'])]
+    
+    def print_plan(self, actions: List[dict]):
+        counts = {kind: sum(1 for action in actions if action['action'] == kind)
+                  for kind in ("synthesize", "rename", "delete")}
+        chars = sum(action.get('chars', 0) for action in actions)
+        print(f"📝 Plan: {counts['synthesize']} synthesize ({chars} characters), "
+              f"{counts['rename']} rename, {counts['delete']} delete")
+        for action in actions:
+            where = f"{action['episode']}/{action['segment']} ({action['provider']})"
+            if action['action'] == "synthesize":
+                print(f"   🎤 synthesize {where}: {action['reason']}")
+            elif action['action'] == "rename":
+                print(f"   🔀 rename {action['episode']}/{action['from']} -> {where}")
+            else:
+                print(f"   🗑️  delete {where}")
+        if not actions:
+            print("   ✅ Everything is up to date")
+    
+    async def apply_plan(self, actions: List[dict], output_dir: str = "public/audio/voiceovers"):
+        """Execute plan() actions and rewrite the affected metadata.json files"""
+        groups = {}
+        for action in actions:
+            groups.setdefault((action['provider'], action['episode']), []).append(action)
+        providers = {provider.name: provider for provider in self.providers}
+        
+        self.run_start = time.monotonic()
+        self.open_events(output_dir)
+        try:
+            results = await asyncio.gather(*(
+                self.apply_episode(providers[name], episode_id, group, output_dir)
+                for (name, episode_id), group in groups.items()
+            ))
+        finally:
+            self.close_events()
+        generated = sum(generated for generated, _ in results)
+        errors = sum(errors for _, errors in results)
+        save_stats(output_dir, self.samples, self.attempts)
+        with output_lock(output_dir):
+            self.write_catalog(output_dir)
+        print(f"\n✅ Plan applied: {generated} synthesized, {errors} errors")
+        return {"generated": generated, "errors": errors}
+    
+    async def apply_episode(self, provider, episode_id: str, actions: List[dict], output_dir: str) -> tuple:
+        episode_data = self.scripts[episode_id]
+        ep_output_dir = Path(output_dir) / self.episode_dir(provider, episode_id)
+        ep_output_dir.mkdir(parents=True, exist_ok=True)
+        
+        metadata_file = self.metadata_file(ep_output_dir)
+        metadata = self.recorded_metadata(ep_output_dir) or {"episode_id": episode_id, "segments": []}
+        entries = {entry['id']: entry for entry in metadata.get('segments', []) if 'id' in entry}
+        
+        for action in actions:
+            if action['action'] == "rename":
+                entry = entries.pop(action['from'])
+                new_file = action['segment'] + Path(entry['file']).suffix
+                os.replace(ep_output_dir / entry['file'], ep_output_dir / new_file)
+                entries[action['segment']] = {**entry, "id": action['segment'], "file": new_file}
+            elif action['action'] == "delete":
+                entry = entries.pop(action['segment'])
+                if entry.get('file'):
+                    (ep_output_dir / entry['file']).unlink(missing_ok=True)
+        
+        wanted = {action['segment'] for action in actions if action['action'] == "synthesize"}
+        results = await asyncio.gather(*(
+            self.generate_segment(provider, episode_id, segment, ep_output_dir)
+            for segment in episode_data['segments'] if segment['id'] in wanted
+        ))
+        if wanted:
+            self.check_deadline(episode_id)
+        # A failed segment keeps its previous entry, which still describes the audio on disk
+        for entry in results:
+            if entry:
+                entries[entry['id']] = entry
+        
+        metadata.update({
+            "title": episode_data['title'],
+            "generated": time.strftime("%Y-%m-%d %H:%M:%S"),
+            "provider": provider.label,
+            "segments": [entries[segment['id']] for segment in self.shard_segments(episode_id) if segment['id'] in entries]
+        })
+        if self.shard:
+            metadata['shard'] = "{}/{}".format(*self.shard)
+        with self.stage("metadata_write"):
+            write_json_atomic(metadata_file, metadata)
+        print(f"   📋 Metadata saved: {metadata_file}")
+        
+        generated = sum(1 for entry in results if entry)
+        return generated, len(results) - generated
+
+    def merge(self, episodes: Optional[List[str]] = None, output_dir: str = "public/audio/voiceovers") -> dict:
+        """Fold shard partial metadata and manifests into metadata.json and manifest.json"""
+        if episodes is None:
+            episodes = list(self.scripts.keys())
+        
+        with output_lock(output_dir):
+            merged = self.merge_locked(episodes, output_dir)
+            self.write_catalog(output_dir)
+        print(f"\n✅ Merged {merged['shard_files']} shard files into {merged['episodes']} episodes "
+              f"({merged['segments']} segments)")
+        return merged
+    
+    def write_catalog(self, output_dir: str):
+        """Rebuild the catalog index from every episode's metadata.json (shards leave it to merge).
+
+        Callers hold output_lock, so a catalog built from older metadata never replaces a newer one.
+        """
+        if self.shard:
+            return
+        with self.stage("catalog_write"):
+            write_catalog(output_dir, msgpack=self.catalog_msgpack)
+    
+    def merge_locked(self, episodes: List[str], output_dir: str) -> dict:
+        merged = {"episodes": 0, "segments": 0, "shard_files": 0}
+        for provider in self.providers:
+            for episode_id in episodes:
+                if episode_id not in self.scripts:
+                    print(f"❌ Episode {episode_id} not found in scripts")
+                    continue
+                ep_output_dir = Path(output_dir) / self.episode_dir(provider, episode_id)
+                partials = sorted(ep_output_dir.glob(SHARD_METADATA.format(index="*", count="*")))
+                if not partials:
+                    continue
+                
+                metadata_file = ep_output_dir / "metadata.json"
+                metadata = read_metadata(metadata_file) or {"episode_id": episode_id}
+                entries = {entry['id']: entry for entry in metadata.get('segments', []) if 'id' in entry}
+                for partial in partials:
+                    for entry in (read_metadata(partial) or {}).get('segments', []):
+                        if 'id' in entry:
+                            entries[entry['id']] = entry
+                
+                # Script order; entries for segments removed from the script are dropped
+                episode_data = self.scripts[episode_id]
+                metadata.pop('shard', None)
+                metadata.update({
+                    "title": episode_data['title'],
+                    "generated": time.strftime("%Y-%m-%d %H:%M:%S"),
+                    "provider": provider.label,
+                    "segments": [entries[segment['id']] for segment in episode_data['segments']
+                                 if segment['id'] in entries]
+                })
+                write_json_atomic(metadata_file, metadata)
+                for partial in partials:
+                    partial.unlink()
+                print(f"   📋 {metadata_file}: {len(metadata['segments'])} segments from {len(partials)} shards")
+                merged['episodes'] += 1
+                merged['segments'] += len(metadata['segments'])
+                merged['shard_files'] += len(partials)
+        
+        manifest_file = Path(output_dir) / "manifest.json"
+        partials = sorted(Path(output_dir).glob(SHARD_MANIFEST.format(index="*", count="*")))
+        manifests = [manifest for manifest in map(read_metadata, partials) if manifest]
+        shards = sorted(manifest.get('shard', '?') for manifest in manifests)
+        if manifests and {shard.partition('/')[2] for shard in shards} != {str(len(shards))}:
+            # Episode metadata is merged as shards finish; the run's manifest waits for all of them
+            print(f"⚠️  Only shards {', '.join(shards)} have finished; manifest.json is merged once all are done")
+        elif manifests:
+            write_json_atomic(manifest_file, merge_manifests(manifests))
+            for partial in partials:
+                partial.unlink()
+            print(f"   📋 {manifest_file}: merged shards {', '.join(shards)}")
+        return merged
+    
+    async def sync(self, episodes: Optional[List[str]] = None, output_dir: str = "public/audio/voiceovers",
+                   segments: Optional[List[str]] = None) -> dict:
+        """Re-read the scripts and apply the plan for every segment that changed since metadata.json was written"""
+        self.scripts = self._load_scripts()
+        # Only this pass's requests are appended to the latency and retry history
+        self.samples = {}
+        self.attempts = {}
+        
+        actions = self.plan(episodes=episodes, output_dir=output_dir)
+        if segments is not None:
+            actions = [action for action in actions if action['segment'] in segments]
+        self.print_plan(actions)
+        if not actions:
+            return {"generated": 0, "errors": 0, "actions": 0}
+        result = await self.apply_plan(actions, output_dir=output_dir)
+        return {**result, "actions": len(actions)}
+    
+    async def watch(self, episodes: Optional[List[str]] = None, output_dir: str = "public/audio/voiceovers",
+                    debounce: float = WATCH_DEBOUNCE):
+        """Regenerate touched segments whenever the script sources change, until interrupted"""
+        snapshot = watched_sources()
+        if not snapshot:
+            raise FileNotFoundError(f"Nothing to watch: neither {VOICEOVER_SCRIPTS_PATH} nor "
+                                    f"{EPISODE_SOURCES_PATH / EPISODE_SCRIPTS_GLOB} exist")
+        print(f"👀 Watching {len(snapshot)} script files under {VOICEOVER_SCRIPTS_PATH.parent.parent}")
+        await self.sync(episodes, output_dir)
+        while True:
+            await asyncio.sleep(WATCH_INTERVAL)
+            current = watched_sources()
+            if current == snapshot:
+                continue
+            
+            # Editors save in several writes; wait until the sources stop changing
+            while True:
+                await asyncio.sleep(debounce)
+                latest = watched_sources()
+                if latest == current:
+                    break
+                current = latest
+            changed = sorted(path for path in snapshot.keys() | current.keys() if snapshot.get(path) != current.get(path))
+            snapshot = current
+            
+            print(f"\n🔄 Changed: {', '.join(Path(path).name for path in changed)}")
+            try:
+                await self.sync(episodes, output_dir)
+            except (OSError, ValueError) as e:
+                # A half-written scripts file fails to parse; the next save triggers another pass
+                print(f"⚠️  Skipped regeneration: {e}")
+    
+    def workload(self, episodes: Optional[List[str]] = None, actions: Optional[List[dict]] = None) -> List[tuple]:
+        """(provider, voice_type, characters) for every request a run or a plan would make"""
+        def requests(provider, segment_id, text):
+            voice_type = provider.select_voice(segment_id, text)[0]
+            return [(provider, voice_type, len(chunk)) for chunk in split_text(text, provider.max_chars, self.split_over)]
+        
+        if actions is not None:
+            providers = {provider.name: provider for provider in self.providers}
+            texts = {(episode_id, segment['id']): segment['text']
+                     for episode_id, episode in self.scripts.items() for segment in episode['segments']}
+            work = []
+            for action in actions:
+                if action['action'] != "synthesize":
+                    continue
+                provider = providers[action['provider']]
+                text = texts[(action['episode'], action['segment'])]
+                work.extend(requests(provider, action['segment'], text))
+            return work
+        
+        if episodes is None:
+            episodes = list(self.scripts.keys())
+        return [request for provider in self.providers
+                for episode_id in episodes if episode_id in self.scripts
+                for segment in self.shard_segments(episode_id)
+                for request in requests(provider, segment['id'], segment['text'])]
+    
+    def dry_run(self, work: List[tuple], output_dir: str = "public/audio/voiceovers") -> dict:
+        """Print character and request counts with a wall-time estimate; nothing is synthesized"""
+        history = load_stats(output_dir)
+        estimate = {"providers": {}}
+        
+        print(f"🧮 Dry run - {len(work)} requests, {sum(chars for _, _, chars in work)} characters")
+        print("=" * 60)
+        for provider in self.providers:
+            requests = [(voice_type, chars) for engine, voice_type, chars in work if engine is provider]
+            if not requests:
+                continue
+            stats = history.get(provider.name) or empty_stats()
+            samples = stats['samples']
+            latencies = [request_latency(samples, chars, provider.default_latency) for _, chars in requests]
+            retries, slot_retries, backoff = retry_cost(stats, self.retries)
+            retry_rate = stats['retries'] / stats['requests'] if stats['requests'] else 0.0
+            limited_rate = stats['rate_limited'] / stats['requests'] if stats['requests'] else 0.0
+            # Requests overlap up to the concurrency budget but cannot start faster than the rate limit.
+            # Retried attempts take a slot again (429s are answered at once) and start again, and each
+            # request also waits out its expected backoff
+            wall = max(sum(latencies) * (1 + slot_retries) / provider.concurrency,
+                       (len(requests) * (1 + retries) - 1) * provider.min_interval + max(latencies)) + backoff
+            
+            voices = {}
+            for voice_type, chars in requests:
+                counts = voices.setdefault(voice_type, {"requests": 0, "chars": 0})
+                counts['requests'] += 1
+                counts['chars'] += chars
+            estimate['providers'][provider.name] = {
+                "requests": len(requests),
+                "chars": sum(chars for _, chars in requests),
+                "voices": voices,
+                "concurrency": provider.concurrency,
+                "recorded_samples": len(samples),
+                "retry_rate": round(retry_rate, 4),
+                "rate_limited_rate": round(limited_rate, 4),
+                "expected_retries": round(len(requests) * retries, 1),
+                "estimated_seconds": round(wall, 1)
+            }
+            
+            basis = f"{len(samples)} recorded requests" if samples else f"no history, assuming {provider.default_latency}s/request"
+            if stats['requests']:
+                basis += f", {retry_rate:.0%} retried, {limited_rate:.0%} rate-limited"
+            print(f"\n🔌 {provider.label} (concurrency {provider.concurrency}, {basis})")
+            for voice_type, counts in sorted(voices.items()):
+                print(f"   {voice_type:<14}{counts['requests']:>6} requests{counts['chars']:>10} chars")
+            print(f"   ⏱️  ~{format_duration(wall)}")
+        
+        # Providers run concurrently, so the slowest one sets the total
+        total = max((stats['estimated_seconds'] for stats in estimate['providers'].values()), default=0)
+        estimate['estimated_seconds'] = total
+        print(f"\n{'='*60}")
+        print(f"⏱️  Estimated wall time: ~{format_duration(total)}")
+        return estimate
+
+class SlowCallbacks(logging.Handler):
+    """Collects the 'Executing ... took N seconds' warnings asyncio debug mode logs"""
+    
+    def __init__(self):
+        super().__init__(logging.WARNING)
+        self.messages = []
+    
+    def emit(self, record):
+        message = record.getMessage()
+        if message.startswith("Executing"):
+            self.messages.append(message)
+
+class Profiler:
+    """--profile: per-stage wall/CPU time, event-loop stalls, and optional cProfile and tracemalloc"""
+    
+    def __init__(self, slow_callback_ms: float = 100.0, cprofile: bool = False, memory: bool = False):
+        self.slow_callback = slow_callback_ms / 1000
+        self.stages = {}
+        self.slow_callbacks = SlowCallbacks()
+        self.cprofile = None
+        self.memory = memory
+        if cprofile:
+            import cProfile
+            self.cprofile = cProfile.Profile()
+    
+    @contextlib.contextmanager
+    def stage(self, name: str):
+        wall, cpu = time.perf_counter(), time.process_time()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - wall, time.process_time() - cpu)
+    
+    def add(self, name: str, wall: float, cpu: float = 0.0):
+        stats = self.stages.setdefault(name, {"count": 0, "wall": 0.0, "cpu": 0.0, "max_wall": 0.0})
+        stats['count'] += 1
+        stats['wall'] += wall
+        stats['cpu'] += cpu
+        stats['max_wall'] = max(stats['max_wall'], wall)
+    
+    def run(self, coro):
+        """asyncio.run(coro) in debug mode with slow-callback detection and the optional profilers"""
+        async def profiled():
+            asyncio.get_running_loop().slow_callback_duration = self.slow_callback
+            return await coro
+        
+        logger = logging.getLogger("asyncio")
+        logger.addHandler(self.slow_callbacks)
+        if self.memory:
+            import tracemalloc
+            tracemalloc.start(10)
+        if self.cprofile:
+            self.cprofile.enable()
+        self.started = time.strftime("%Y-%m-%d %H:%M:%S")
+        wall, cpu = time.perf_counter(), time.process_time()
+        try:
+            return asyncio.run(profiled(), debug=True)
+        finally:
+            self.wall, self.cpu = time.perf_counter() - wall, time.process_time() - cpu
+            if self.cprofile:
+                self.cprofile.disable()
+            logger.removeHandler(self.slow_callbacks)
+    
+    def save(self, output_dir: str) -> Path:
+        """Write the results next to the manifest and print a summary"""
+        run = time.strftime("%Y%m%d-%H%M%S")
+        result = {
+            "started": self.started,
+            "wall": round(self.wall, 3),
+            "cpu": round(self.cpu, 3),
+            "stages": {name: {key: round(value, 4) if isinstance(value, float) else value
+                              for key, value in stats.items()}
+                       for name, stats in sorted(self.stages.items(), key=lambda item: -item[1]['wall'])},
+            "slow_callback_threshold_ms": self.slow_callback * 1000,
+            "slow_callbacks": self.slow_callbacks.messages,
+        }
+        
+        if self.memory:
+            import tracemalloc
+            current, peak = tracemalloc.get_traced_memory()
+            top = tracemalloc.take_snapshot().statistics("lineno")[:10]
+            tracemalloc.stop()
+            result['memory'] = {
+                "current_mb": round(current / 1024 / 1024, 2),
+                "peak_mb": round(peak / 1024 / 1024, 2),
+                "top": [{"where": str(stat.traceback), "kb": round(stat.size / 1024, 1), "count": stat.count}
+                        for stat in top],
+            }
+        
+        if self.cprofile:
+            pstats_file = Path(output_dir) / CPROFILE_FILE.format(run=run)
+            self.cprofile.dump_stats(pstats_file)
+            result['cprofile'] = pstats_file.name
+        
+        profile_file = Path(output_dir) / PROFILE_FILE.format(run=run)
+        write_json_atomic(profile_file, result)
+        
+        print(f"\n⏱️  Profile: {self.wall:.2f}s wall, {self.cpu:.2f}s CPU")
+        print(f"   {'stage':<18}{'count':>7}{'wall s':>10}{'cpu s':>9}{'max s':>9}")
+        for name, stats in result['stages'].items():
+            print(f"   {name:<18}{stats['count']:>7}{stats['wall']:>10.3f}{stats['cpu']:>9.3f}{stats['max_wall']:>9.3f}")
+        print(f"   Event loop stalls over {self.slow_callback * 1000:g}ms: {len(self.slow_callbacks.messages)}")
+        if self.memory:
+            print(f"   Peak traced memory: {result['memory']['peak_mb']} MB")
+        if self.cprofile:
+            print(f"   cProfile: {Path(output_dir) / result['cprofile']} (python -m pstats)")
+        print(f"   📋 Profile saved: {profile_file}")
+        return profile_file
+
+class EventLog:
+    """Appends one JSON object per line; the run id ties together the events of one invocation"""
+    
+    def __init__(self, path):
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self.file = open(path, 'a')
+        self.run = f"{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}"
+    
+    def write(self, event: dict):
+        self.file.write(json.dumps({"run": self.run, "ts": round(time.time(), 3), **event}) + "\n")
+    
+    def close(self):
+        self.file.close()
+
+def events_file(output_dir: str, shard: Optional[tuple] = None) -> Path:
+    """Default event log: events.jsonl, or the shard's own file so shards never interleave appends"""
+    if shard is None:
+        return Path(output_dir) / EVENTS_FILE
+    return Path(output_dir) / SHARD_EVENTS.format(index=shard[0], count=shard[1])
+
+def read_events(path, run: Optional[str] = None, all_runs: bool = False) -> List[dict]:
+    """Events from one run (the latest by default) or from every run"""
+    events = []
+    with open(path) as f:
+        for line in f:
+            try:
+                events.append(json.loads(line))
+            except ValueError:
+                continue
+    if all_runs or not events:
+        return events
+    run = run or events[-1].get('run')
+    return [event for event in events if event.get('run') == run]
+
+def summarize_events(events: List[dict]) -> dict:
+    """Throughput, latency percentiles and error breakdowns from request events"""
+    def stats(group):
+        ok = [event for event in group if event['outcome'] == "ok"]
+        latencies = sorted(event['latency'] for event in ok)
+        ttfbs = sorted(event['ttfb'] for event in ok if 'ttfb' in event)
+        waits = sorted(event.get('queue_wait', 0) for event in group)
+        return {
+            "requests": len(group),
+            "ok": len(ok),
+            "retried": sum(1 for event in group if event['outcome'] == "retry"),
+            "errors": sum(1 for event in group if event['outcome'] == "error"),
+            "cancelled": sum(1 for event in group if event['outcome'] == "cancelled"),
+            "chars": sum(event.get('chars', 0) for event in ok),
+            "bytes": sum(event.get('bytes', 0) for event in ok),
+            "latency_p50": round(percentile(latencies, 50), 3),
+            "latency_p95": round(percentile(latencies, 95), 3),
+            "latency_p99": round(percentile(latencies, 99), 3),
+            "ttfb_p50": round(percentile(ttfbs, 50), 3),
+            "ttfb_p95": round(percentile(ttfbs, 95), 3),
+            "queue_wait_p95": round(percentile(waits, 95), 3),
+        }
+    
+    def wall(group):
+        # Event timestamps mark the end of each request
+        start = min(event['ts'] - event['latency'] - event.get('queue_wait', 0) for event in group)
+        return max(max(event['ts'] for event in group) - start, 1e-6)
+    
+    report = {"runs": sorted({event['run'] for event in events}), "wall_seconds": round(wall(events), 2),
+              "providers": {}, "voices": {}, "errors": {}}
+    for name in sorted({event['provider'] for event in events}):
+        group = [event for event in events if event['provider'] == name]
+        summary = stats(group)
+        seconds = wall(group)
+        summary['requests_per_sec'] = round(summary['ok'] / seconds, 2)
+        summary['chars_per_sec'] = round(summary['chars'] / seconds, 1)
+        report['providers'][name] = summary
+        for voice in sorted({event.get('voice') for event in group}, key=str):
+            report['voices'][f"{name}/{voice}"] = stats([event for event in group if event.get('voice') == voice])
+        for event in group:
+            if event['outcome'] in ("error", "retry"):
+                reason = f"{name} {event.get('status', '-')} {event.get('error', '')[:80]}"
+                report['errors'][reason] = report['errors'].get(reason, 0) + 1
+    return report
+
+def print_report(report: dict):
+    print(f"📈 Run report: {', '.join(report['runs'])} ({report['wall_seconds']}s wall)")
+    print("=" * 78)
+    print(f"{'provider':<20}{'ok':>6}{'err':>5}{'retry':>7}{'req/s':>8}{'chars/s':>9}"
+          f"{'p50 s':>8}{'p95 s':>8}{'ttfb95':>8}")
+    for name, stats in report['providers'].items():
+        print(f"{name:<20}{stats['ok']:>6}{stats['errors']:>5}{stats['retried']:>7}{stats['requests_per_sec']:>8}"
+              f"{stats['chars_per_sec']:>9}{stats['latency_p50']:>8}{stats['latency_p95']:>8}{stats['ttfb_p95']:>8}")
+    print(f"\n{'provider/voice':<28}{'ok':>6}{'p50 s':>8}{'p95 s':>8}{'p99 s':>8}{'wait95':>8}")
+    for name, stats in report['voices'].items():
+        print(f"{name:<28}{stats['ok']:>6}{stats['latency_p50']:>8}{stats['latency_p95']:>8}"
+              f"{stats['latency_p99']:>8}{stats['queue_wait_p95']:>8}")
+    if report['errors']:
+        print(f"\n❌ Errors and retries")
+        for reason, count in sorted(report['errors'].items(), key=lambda item: -item[1]):
+            print(f"   {count:>5}  {reason}")
+
+class GenerationDaemon:
+    """Runs generation jobs one at a time on a long-lived AudioGenerator.
+    
+    Provider clients, the ElevenLabs voice lookup, hedge latencies and rate
+    limiters stay on one event loop for the daemon's lifetime. The HTTP API
+    runs in its own threads and hands jobs to that loop. The queue is saved
+    after every change, so queued and interrupted jobs resume after a restart.
+    """
+    
+    def __init__(self, generator: AudioGenerator, output_dir: str):
+        self.generator = generator
+        self.output_dir = output_dir
+        self.jobs_file = Path(output_dir) / DAEMON_JOBS_FILE
+        self.lock = threading.Lock()
+        self.jobs = {}
+        self.loop = None
+        self.queue = None
+        self.current = None
+        self.started = time.time()
+        
+        saved = read_metadata(self.jobs_file) or {}
+        for job in saved.get('jobs', []):
+            if job.get('status') == "running":
+                # Interrupted by a shutdown: run it again from the start
+                job['status'] = "queued"
+            self.jobs[job['id']] = job
+    
+    def save(self):
+        """Persist the job list; callers hold self.lock"""
+        finished = [job for job in self.jobs.values() if job['status'] not in ("queued", "running")]
+        for job in finished[:max(0, len(finished) - DAEMON_HISTORY)]:
+            del self.jobs[job['id']]
+        Path(self.output_dir).mkdir(parents=True, exist_ok=True)
+        write_json_atomic(self.jobs_file, {"jobs": list(self.jobs.values())})
+    
+    def submit(self, request: dict) -> dict:
+        """Queue a job; raises ValueError for a malformed request"""
+        command = request.get('command', 'plan')
+        if command not in ("plan", "generate"):
+            raise ValueError("command must be 'plan' or 'generate'")
+        for field in ("episodes", "segments"):
+            value = request.get(field)
+            if value is not None and not (isinstance(value, list) and all(isinstance(item, str) for item in value)):
+                raise ValueError(f"{field} must be a list of strings")
+        if request.get('segments') is not None and command != "plan":
+            raise ValueError("segments can only be given with the plan command")
+        priority = request.get('priority', 0)
+        if not isinstance(priority, int) or isinstance(priority, bool):
+            raise ValueError("priority must be an integer")
+        
+        job = {
+            "id": uuid.uuid4().hex[:12],
+            "command": command,
+            "episodes": request.get('episodes'),
+            "segments": request.get('segments'),
+            "priority": priority,
+            "status": "queued",
+            "submitted": round(time.time(), 3)
+        }
+        with self.lock:
+            self.jobs[job['id']] = job
+            self.save()
+            snapshot = dict(job)
+        self.loop.call_soon_threadsafe(self.enqueue, job)
+        return snapshot
+    
+    def cancel(self, job_id: str) -> Optional[dict]:
+        """Cancel a queued or running job; None if there is no such job"""
+        with self.lock:
+            job = self.jobs.get(job_id)
+            if job is None:
+                return None
+            if job['status'] == "queued":
+                job.update(status="cancelled", finished=round(time.time(), 3))
+                self.save()
+            elif job['status'] == "running" and self.current and self.current[0] == job_id:
+                job['cancel_requested'] = True
+                self.loop.call_soon_threadsafe(self.current[1].cancel)
+            return dict(job)
+    
+    def job(self, job_id: str) -> Optional[dict]:
+        with self.lock:
+            job = self.jobs.get(job_id)
+            return dict(job) if job else None
+    
+    def list_jobs(self) -> List[dict]:
+        with self.lock:
+            return [dict(job) for job in self.jobs.values()]
+    
+    def health(self) -> dict:
+        with self.lock:
+            statuses = [job['status'] for job in self.jobs.values()]
+            running = self.current[0] if self.current else None
+        return {
+            "pid": os.getpid(),
+            "uptime": round(time.time() - self.started, 1),
+            "providers": {provider.name: provider.limits() for provider in self.generator.providers},
+            "queued": statuses.count("queued"),
+            "running": running
+        }
+    
+    async def execute(self, job: dict) -> dict:
+        generator = self.generator
+        if job['command'] == "plan":
+            return await generator.sync(job['episodes'], self.output_dir, job['segments'])
+        
+        # Pick up script edits made since the previous job; only this job's samples go to the stats file
+        generator.scripts = generator._load_scripts()
+        generator.samples = {}
+        generator.attempts = {}
+        return await generator.generate_all(episodes=job['episodes'], output_dir=self.output_dir)
+    
+    def enqueue(self, job: dict):
+        # Highest priority first, then submission order
+        self.queue.put_nowait((-job.get('priority', 0), job['submitted'], job['id']))
+    
+    async def work(self):
+        """Take jobs off the queue by priority and run them one at a time"""
+        while True:
+            _, _, job_id = await self.queue.get()
+            with self.lock:
+                job = self.jobs.get(job_id)
+                if job is None or job['status'] != "queued":
+                    continue
+                job.update(status="running", started=round(time.time(), 3))
+                self.save()
+            print(f"\n🛠️  Job {job_id}: {job['command']} {', '.join(job['episodes'] or ['all episodes'])}")
+            
+            task = asyncio.create_task(self.execute(job))
+            self.current = (job_id, task)
+            try:
+                update = {"status": "done", "result": await task}
+            except asyncio.CancelledError:
+                if not job.get('cancel_requested'):
+                    # Shutting down: the job stays "running" on disk and is requeued on restart
+                    raise
+                update = {"status": "cancelled"}
+            except Exception as e:
+                update = {"status": "failed", "error": str(e)}
+            finally:
+                self.current = None
+            with self.lock:
+                job.pop('cancel_requested', None)
+                job.update(update, finished=round(time.time(), 3))
+                self.save()
+            print(f"   Job {job_id}: {job['status']}")
+    
+    async def run(self, server):
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.PriorityQueue()
+        for job in self.jobs.values():
+            if job['status'] == "queued":
+                self.enqueue(job)
+        
+        with contextlib.suppress(NotImplementedError):
+            # Service managers stop daemons with SIGTERM; treat it like Ctrl+C
+            self.loop.add_signal_handler(signal.SIGTERM, asyncio.current_task().cancel)
+        
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        try:
+            await self.work()
+        finally:
+            server.shutdown()
+            server.server_close()
+    
+    def serve(self, port: int = DAEMON_PORT, socket_path: Optional[str] = None):
+        """Listen on localhost:port, or on a Unix socket, until interrupted"""
+        if socket_path:
+            # A socket file left behind by a daemon that did not shut down cleanly
+            with contextlib.suppress(FileNotFoundError):
+                os.unlink(socket_path)
+        server = daemon_server(port, socket_path)
+        server.generation = self
+        where = f"unix:{socket_path}" if socket_path else f"http://127.0.0.1:{port}"
+        
+        queued = sum(1 for job in self.jobs.values() if job['status'] == "queued")
+        print(f"🛰️  Generation daemon for {', '.join(provider.label for provider in self.generator.providers)}")
+        print(f"   Listening on {where}, {queued} queued jobs restored from {self.jobs_file}")
+        try:
+            asyncio.run(self.run(server))
+        except (KeyboardInterrupt, asyncio.CancelledError):
+            print("\n👋 Daemon stopped")
+        finally:
+            if socket_path:
+                with contextlib.suppress(FileNotFoundError):
+                    os.unlink(socket_path)
+
+def daemon_server(port: int, socket_path: Optional[str] = None):
+    """Threaded server for the daemon's job API; http.server is only imported when a daemon starts"""
+    import http.server
+    import socketserver
+    
+    class DaemonHandler(http.server.BaseHTTPRequestHandler):
+        """POST /jobs, GET /jobs, GET /jobs/<id>, DELETE /jobs/<id> and GET /health, all JSON"""
+        
+        def do_GET(self):
+            path = self.path.split('?', 1)[0].rstrip('/')
+            daemon = self.server.generation
+            if path == "/health":
+                self.reply(200, daemon.health())
+            elif path == "/jobs":
+                self.reply(200, {"jobs": daemon.list_jobs()})
+            elif path.startswith("/jobs/"):
+                job = daemon.job(path[len("/jobs/"):])
+                if job:
+                    self.reply(200, job)
+                else:
+                    self.reply(404, {"error": "no such job"})
+            else:
+                self.reply(404, {"error": "not found"})
+        
+        def do_POST(self):
+            if self.path.split('?', 1)[0].rstrip('/') != "/jobs":
+                self.reply(404, {"error": "not found"})
+                return
+            try:
+                length = int(self.headers.get('Content-Length') or 0)
+                request = json.loads(self.rfile.read(length) or b"{}")
+                if not isinstance(request, dict):
+                    raise ValueError("expected a JSON object")
+                job = self.server.generation.submit(request)
+            except ValueError as e:
+                self.reply(400, {"error": str(e)})
+                return
+            self.reply(202, job)
+        
+        def do_DELETE(self):
+            path = self.path.split('?', 1)[0].rstrip('/')
+            job = self.server.generation.cancel(path[len("/jobs/"):]) if path.startswith("/jobs/") else None
+            if job:
+                self.reply(200, job)
+            else:
+                self.reply(404, {"error": "no such job"})
+        
+        def reply(self, status: int, body: dict):
+            data = json.dumps(body, indent=2).encode()
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+        
+        def log_message(self, format, *args):
+            # Job progress is printed by the daemon itself
+            pass
+    
+    if socket_path:
+        server = socketserver.ThreadingUnixStreamServer(socket_path, DaemonHandler)
+        server.daemon_threads = True
+        return server
+    return http.server.ThreadingHTTPServer(("127.0.0.1", port), DaemonHandler)
+
+def watched_sources() -> Dict[str, tuple]:
+    """(mtime, size) of every file _load_scripts reads segments from"""
+    signatures = {}
+    for path in [VOICEOVER_SCRIPTS_PATH, *sorted(EPISODE_SOURCES_PATH.glob(EPISODE_SCRIPTS_GLOB))]:
+        try:
+            st = path.stat()
+        except OSError:
+            continue
+        signatures[str(path)] = (st.st_mtime_ns, st.st_size)
+    return signatures
+
+def episode_script_id(path: Path) -> Optional[str]:
+    """sNeM for src/episodes/seasonN/epM-*/voiceovers/scripts.js"""
+    season = EPISODE_DIR_RE.match(path.parent.parent.parent.name)
+    episode = EPISODE_DIR_RE.match(path.parent.parent.name)
+    if not (season and season.group(1) and episode and episode.group(2)):
+        return None
+    return f"s{int(season.group(1))}e{int(episode.group(2))}"
+
+def js_string(literal: str) -> str:
+    return re.sub(r"\\(.)", lambda m: {"n": "\n", "t": "\t"}.get(m.group(1), m.group(1)), literal)
+
+def load_episode_scripts() -> Dict[str, dict]:
+    """Episodes from their voiceover modules: segment ids and text in file order, title from index.js.
+
+    Reads only the literal { id: '...', ..., text: "..." } objects the modules export, not
+    arbitrary JavaScript; segments whose text is built at runtime are skipped.
+    """
+    scripts = {}
+    for path in sorted(EPISODE_SOURCES_PATH.glob(EPISODE_SCRIPTS_GLOB)):
+        episode_id = episode_script_id(path)
+        try:
+            source = path.read_text()
+        except OSError:
+            continue
+        segments = [{"id": js_string(match.group(2)), "text": js_string(match.group(4))}
+                    for match in JS_SEGMENT_RE.finditer(source)]
+        if episode_id is None or not segments:
+            continue
+        try:
+            title = JS_TITLE_RE.search((path.parent.parent / "index.js").read_text())
+        except OSError:
+            title = None
+        scripts[episode_id] = {"title": js_string(title.group(2)) if title else episode_id, "segments": segments}
+    return scripts
+
+def audio_hash(audio: bytes) -> str:
+    return hashlib.sha256(audio).hexdigest()[:16]
+
+def catalog_segment(ep_output_dir: Path, entry: dict) -> Optional[dict]:
+    """Catalog entry for one metadata.json segment, or None when its audio is missing"""
+    if not entry.get('id') or not entry.get('file'):
+        return None
+    path = ep_output_dir / entry['file']
+    try:
+        size = path.stat().st_size
+    except OSError:
+        return None
+    duration, digest = entry.get('duration'), entry.get('hash')
+    if entry.get('bytes') != size or not digest:
+        # Entries from older runs or from the server's on-demand synthesis: read the audio once
+        audio = path.read_bytes()
+        duration = audio_duration(path.suffix.lstrip('.'), audio)
+        duration = round(duration, 3) if duration else None
+        digest = audio_hash(audio)
+    return {"id": entry['id'], "url": f"{ep_output_dir.name}/{entry['file']}", "duration": duration,
+            "bytes": size, "hash": digest}
+
+def build_catalog(output_dir: str) -> dict:
+    """Every episode's segment ids, URLs, durations, sizes and content hashes, without the narration text"""
+    episodes = {}
+    for metadata_file in sorted(Path(output_dir).glob("*/metadata.json")):
+        ep_output_dir = metadata_file.parent
+        metadata = read_metadata(metadata_file)
+        # Underscore directories hold previews rather than episodes
+        if not metadata or ep_output_dir.name.startswith("_"):
+            continue
+        segments = [segment for segment in (catalog_segment(ep_output_dir, entry)
+                                            for entry in metadata.get('segments', [])) if segment]
+        episodes[ep_output_dir.name] = {
+            "title": metadata.get('title', ep_output_dir.name),
+            "provider": metadata.get('provider'),
+            "duration": round(sum(segment['duration'] or 0 for segment in segments), 3),
+            "bytes": sum(segment['bytes'] for segment in segments),
+            "segments": segments
+        }
+    return {"version": 1, "generated": time.strftime("%Y-%m-%d %H:%M:%S"), "base": CATALOG_BASE_URL,
+            "episodes": episodes}
+
+def write_catalog(output_dir: str, msgpack: bool = False) -> dict:
+    """Write catalog.json (compact) and optionally catalog.msgpack next to manifest.json"""
+    catalog = build_catalog(output_dir)
+    catalog_file = Path(output_dir) / CATALOG_FILE
+    data = json.dumps(catalog, separators=(',', ':')).encode()
+    write_bytes_atomic(catalog_file, data)
+    print(f"   🗂️  Catalog saved: {catalog_file} ({len(catalog['episodes'])} episodes, {len(data)} bytes)")
+    if msgpack:
+        try:
+            import msgpack as packer
+        except ImportError:
+            print("⚠️  msgpack not installed, skipping catalog.msgpack. Run: pip install msgpack")
+            return catalog
+        packed = packer.packb(catalog)
+        write_bytes_atomic(Path(output_dir) / CATALOG_MSGPACK_FILE, packed)
+        print(f"   🗂️  Catalog saved: {Path(output_dir) / CATALOG_MSGPACK_FILE} ({len(packed)} bytes)")
+    return catalog
+
+def merge_manifests(manifests: List[dict]) -> dict:
+    """One manifest.json from the shard manifests of a run"""
+    statistics = {"total_segments": 0, "generated": 0, "errors": 0, "providers": {}}
+    episodes = []
+    for manifest in manifests:
+        stats = manifest.get('statistics', {})
+        for key in ("total_segments", "generated", "errors"):
+            statistics[key] += stats.get(key, 0)
+        for name, provider_stats in stats.get('providers', {}).items():
+            merged = statistics['providers'].setdefault(name, {"generated": 0, "errors": 0})
+            merged['generated'] += provider_stats.get('generated', 0)
+            merged['errors'] += provider_stats.get('errors', 0)
+        episodes.extend(episode for episode in manifest.get('episodes', []) if episode not in episodes)
+    # Shards run side by side, so the slowest one sets the duration
+    durations = [float(manifest.get('statistics', {}).get('duration', '0s').rstrip('s') or 0) for manifest in manifests]
+    statistics['duration'] = f"{max(durations, default=0):.1f}s"
+    return {
+        "generated": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "provider": manifests[0].get('provider', ''),
+        "shards": len(manifests),
+        "statistics": statistics,
+        "episodes": episodes
+    }
+
+@contextlib.contextmanager
+def output_lock(output_dir: str):
+    """Exclusive advisory lock on the output directory, held across processes and machines sharing it"""
+    Path(output_dir).mkdir(parents=True, exist_ok=True)
+    with open(Path(output_dir) / LOCK_FILE, 'a') as lock:
+        if fcntl:
+            # lockf takes POSIX record locks, which NFS forwards to the server unlike flock
+            fcntl.lockf(lock, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl:
+                fcntl.lockf(lock, fcntl.LOCK_UN)
+
+def empty_stats() -> dict:
+    return {"samples": [], **dict.fromkeys(ATTEMPT_COUNTS, 0)}
+
+def load_stats(output_dir: str) -> Dict[str, dict]:
+    """Recorded (characters, seconds) request samples and attempt counts by provider"""
+    try:
+        with open(Path(output_dir) / STATS_FILE) as f:
+            recorded = json.load(f)
+        history = {}
+        for name, entry in recorded.items():
+            if isinstance(entry, list):
+                # Written before attempt counts were recorded: samples only
+                entry = {"samples": entry}
+            history[name] = {"samples": [tuple(sample) for sample in entry.get('samples', [])],
+                             **{key: int(entry.get(key, 0)) for key in ATTEMPT_COUNTS}}
+        return history
+    except (OSError, ValueError, TypeError, AttributeError):
+        return {}
+
+def save_stats(output_dir: str, samples: Dict[str, list], attempts: Optional[Dict[str, dict]] = None):
+    """Append this run's request samples and attempt counts to the history, keeping the most recent per provider"""
+    attempts = attempts or {}
+    if not samples and not attempts:
+        return
+    # Shards sharing an output directory all append to the same history
+    with output_lock(output_dir):
+        history = load_stats(output_dir)
+        for name in samples.keys() | attempts.keys():
+            entry = history.setdefault(name, empty_stats())
+            entry['samples'] = (entry['samples'] + [(chars, round(seconds, 3)) for chars, seconds in samples.get(name, [])])[-STATS_SAMPLES:]
+            for key, count in attempts.get(name, {}).items():
+                entry[key] += count
+            if entry['requests'] > STATS_SAMPLES:
+                # Scaled down like the sample window is trimmed, so the rates follow recent runs
+                scale = STATS_SAMPLES / entry['requests']
+                for key in ATTEMPT_COUNTS:
+                    entry[key] = round(entry[key] * scale)
+        write_json_atomic(Path(output_dir) / STATS_FILE, history)
+
+def request_latency(samples: List[tuple], chars: int, default: float) -> float:
+    """Predict one request's latency from a least-squares fit of latency against characters"""
+    if not samples:
+        return default
+    n = len(samples)
+    mean_chars = sum(c for c, _ in samples) / n
+    mean_seconds = sum(s for _, s in samples) / n
+    variance = sum((c - mean_chars) ** 2 for c, _ in samples)
+    if variance == 0:
+        return mean_seconds
+    slope = sum((c - mean_chars) * (s - mean_seconds) for c, s in samples) / variance
+    return max(0.0, mean_seconds + slope * (chars - mean_chars))
+
+def retry_cost(stats: dict, max_retries: int) -> tuple:
+    """Expected (retries, slot-holding retries, backoff seconds) per request from recorded attempt counts.
+
+    An attempt is retried with the recorded retry rate p, so a request reaches its k-th retry with
+    probability p**k. Retries answered with 429 return at once and hold no slot for long.
+    """
+    if not stats['requests']:
+        return 0.0, 0.0, 0.0
+    p = min(stats['retries'] / stats['requests'], 0.99)
+    retries = sum(p ** k for k in range(1, max_retries + 1))
+    limited = min(stats['rate_limited'] / stats['retries'], 1.0) if stats['retries'] else 0.0
+    # request() sleeps RETRY_BACKOFF * 2**k * uniform(0.5, 1.0) before retry k + 1
+    backoff = sum(p ** (k + 1) * RETRY_BACKOFF * 2 ** k * 0.75 for k in range(max_retries))
+    return retries, retries * (1 - limited), backoff
+
+def format_duration(seconds: float) -> str:
+    if seconds < 120:
+        return f"{seconds:.0f}s"
+    if seconds < 7200:
+        return f"{seconds / 60:.1f} min"
+    return f"{seconds / 3600:.1f} h"
+
+def read_metadata(path: Path) -> Optional[Dict]:
+    """Load a metadata.json, or None if it is missing or unreadable"""
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def temp_path(path: Path) -> Path:
+    """A temporary file next to path that no other process or thread sharing the directory writes to"""
+    return path.with_name(f".{path.name}.{os.getpid()}-{uuid.uuid4().hex[:8]}.tmp")
+
+def write_json_atomic(path: Path, data):
+    """Write JSON next to path and rename it into place so readers never see a partial file"""
+    write_bytes_atomic(path, json.dumps(data, indent=2).encode())
+
+def write_bytes_atomic(path: Path, data: bytes):
+    """Binary counterpart of write_json_atomic"""
+    tmp = temp_path(path)
+    try:
+        tmp.write_bytes(data)
+        os.replace(tmp, path)
+    except BaseException:
+        tmp.unlink(missing_ok=True)
+        raise
+
+def parse_shard(value: str) -> tuple:
+    """Parse --shard i/N into (i, N), with shards numbered from 1"""
+    index, sep, count = value.partition("/")
+    if not sep or not index.isdigit() or not count.isdigit() or not 1 <= int(index) <= int(count):
+        raise argparse.ArgumentTypeError(f"invalid --shard '{value}', expected i/N with 1 <= i <= N")
+    return int(index), int(count)
+
+def parse_concurrency(values: List[str]) -> Dict[str, int]:
+    """Parse repeated PROVIDER=N options into a per-provider concurrency map"""
+    budgets = {}
+    for value in values or []:
+        name, sep, count = value.partition("=")
+        if not sep or name.lower() not in PROVIDERS or not count.isdigit() or int(count) < 1:
+            raise argparse.ArgumentTypeError(f"invalid --concurrency '{value}', expected PROVIDER=N")
+        budgets[name.lower()] = int(count)
+    return budgets
+
+def parse_deadlines(values: List[str]) -> Dict[str, float]:
+    """Parse repeated EPISODE=DURATION options (90, 90s, 10m, 1.5h) into seconds from the run start"""
+    units = {"s": 1, "m": 60, "h": 3600}
+    deadlines = {}
+    for value in values or []:
+        episode_id, sep, duration = value.partition("=")
+        scale = units.get(duration[-1:].lower())
+        try:
+            seconds = float(duration[:-1] if scale else duration) * (scale or 1)
+        except ValueError:
+            seconds = -1
+        if not sep or not episode_id or seconds < 0:
+            raise argparse.ArgumentTypeError(f"invalid --deadline '{value}', expected EPISODE=DURATION such as s2e1=10m")
+        deadlines[episode_id] = seconds
+    return deadlines
 
 def main():
     parser = argparse.ArgumentParser(description='Generate audio for TechFlix episodes')
-    parser.add_argument('--provider', choices=['edge', 'gemini'], default='edge',
-                        help='TTS provider to use (default: edge)')
+    parser.add_argument('command', nargs='?', choices=['generate', 'plan', 'report', 'daemon', 'merge', 'catalog'],
+                        default='generate',
+                        help='generate everything (default), plan the minimal update from metadata.json, '
+                             'report on the request events of a run, run a daemon that takes jobs over a local API, '
+                             'merge shard results into metadata.json and manifest.json, '
+                             'or rebuild the catalog index')
+    parser.add_argument('--execute', action='store_true',
+                        help='With plan: carry out the planned synthesize, rename and delete actions')
+    parser.add_argument('--provider', nargs='+', choices=sorted(PROVIDERS), default=['edge'],
+                        help='TTS provider(s) to use; several run concurrently (default: edge)')
+    parser.add_argument('--concurrency', action='append', metavar='PROVIDER=N',
+                        help='Concurrent requests for one provider (repeatable)')
+    parser.add_argument('--hedge', metavar='PROVIDER[:KEY_ENV]',
+                        help='Backup provider for slow requests, optionally with an API key from env var KEY_ENV')
+    parser.add_argument('--hedge-percentile', type=float, default=95.0,
+                        help='Hedge requests slower than this latency percentile (default: 95)')
+    parser.add_argument('--hedge-budget', type=float, default=0.1,
+                        help='Max extra characters sent to the backup, as a fraction (default: 0.1)')
+    parser.add_argument('--hedge-after', type=float, default=15.0,
+                        help='Hedge deadline in seconds until enough latencies are observed (default: 15)')
+    cassette = parser.add_mutually_exclusive_group()
+    cassette.add_argument('--record', metavar='DIR',
+                          help='Record provider requests and responses into a cassette directory')
+    cassette.add_argument('--replay', metavar='DIR',
+                          help='Replay recorded provider responses instead of calling the providers')
+    parser.add_argument('--replay-speed', type=float, default=1.0,
+                        help='Replay timing speed-up; 0 replays instantly (default: 1, original timing)')
+    parser.add_argument('--split-over', type=int, metavar='CHARS',
+                        help='Split segments longer than CHARS into sentences synthesized in parallel '
+                             '(segments over a provider\'s character limit are always split)')
+    parser.add_argument('--retries', type=int, default=2,
+                        help='Retries per request for rate limits and transient errors (default: 2)')
+    parser.add_argument('--events', metavar='FILE',
+                        help='JSON-lines request event log (default: OUTPUT/events.jsonl, or with --shard '
+                             'OUTPUT/events.shard-i-of-N.jsonl)')
+    parser.add_argument('--run', help='With report: the run id to summarize (default: the latest)')
+    parser.add_argument('--all-runs', action='store_true', help='With report: summarize every recorded run')
+    parser.add_argument('--json', metavar='FILE', help='With report: also write the summary as JSON to FILE')
+    parser.add_argument('--profile', action='store_true',
+                        help='Time pipeline stages and detect event-loop stalls; results go next to the manifest')
+    parser.add_argument('--profile-cprofile', action='store_true',
+                        help='With --profile: also record a cProfile .pstats file')
+    parser.add_argument('--profile-memory', action='store_true',
+                        help='With --profile: also track peak memory with tracemalloc')
+    parser.add_argument('--slow-callback-ms', type=float, default=100.0,
+                        help='With --profile: report event-loop callbacks slower than this (default: 100)')
+    parser.add_argument('--watch', action='store_true',
+                        help='Keep running and regenerate changed segments whenever the scripts are saved')
+    parser.add_argument('--debounce', type=float, default=WATCH_DEBOUNCE,
+                        help=f'With --watch: seconds the scripts must stay unchanged before regenerating '
+                             f'(default: {WATCH_DEBOUNCE:g})')
+    parser.add_argument('--port', type=int, default=DAEMON_PORT,
+                        help=f'With daemon: job API port on 127.0.0.1 (default: {DAEMON_PORT})')
+    parser.add_argument('--socket', metavar='PATH',
+                        help='With daemon: serve the job API on a Unix socket instead of a TCP port')
+    parser.add_argument('--openers', type=int, default=DEFAULT_OPENERS, metavar='N',
+                        help=f'Synthesize the first N segments of every episode before any later segment '
+                             f'(default: {DEFAULT_OPENERS}; 0 schedules by deadline and priority only)')
+    parser.add_argument('--priority', nargs='+', metavar='EPISODE',
+                        help='Episodes to synthesize ahead of the rest, most important first')
+    parser.add_argument('--deadline', action='append', metavar='EPISODE=DURATION',
+                        help='Finish EPISODE within DURATION of the run start, e.g. s2e1=10m; '
+                             'the earliest deadline goes first (repeatable)')
+    parser.add_argument('--msgpack', action='store_true',
+                        help=f'Also write the catalog index as {CATALOG_MSGPACK_FILE} (needs the msgpack package)')
+    parser.add_argument('--shard', type=parse_shard, metavar='i/N',
+                        help='Only handle the segments in shard i of N, writing partial metadata for merge')
     parser.add_argument('--episodes', nargs='+', help='Specific episodes to generate')
     parser.add_argument('--output', default='public/audio/voiceovers',
                         help='Output directory (default: public/audio/voiceovers)')
     parser.add_argument('--list-episodes', action='store_true',
                         help='List available episodes')
+    parser.add_argument('--dry-run', action='store_true',
+                        help='Estimate characters, requests and wall time without synthesizing')
     
     args = parser.parse_args()
     
-    generator = AudioGenerator(provider=args.provider)
+    if args.command == 'report':
+        events_path = args.events or events_file(args.output, args.shard)
+        try:
+            events = read_events(events_path, run=args.run, all_runs=args.all_runs)
+        except OSError as e:
+            print(f"❌ Cannot read events: {e}")
+            sys.exit(1)
+        if not events:
+            print(f"❌ No events recorded in {events_path}")
+            sys.exit(1)
+        report = summarize_events(events)
+        print_report(report)
+        if args.json:
+            with open(args.json, 'w') as f:
+                json.dump(report, f, indent=2)
+            print(f"\n📋 Report saved: {args.json}")
+        return
+    
+    if args.command == 'catalog':
+        with output_lock(args.output):
+            write_catalog(args.output, msgpack=args.msgpack)
+        return
+    
+    try:
+        concurrency = parse_concurrency(args.concurrency)
+        deadlines = parse_deadlines(args.deadline)
+    except argparse.ArgumentTypeError as e:
+        parser.error(str(e))
+    
+    if args.hedge and args.hedge.partition(":")[0].lower() not in PROVIDERS:
+        parser.error(f"unknown --hedge provider '{args.hedge}'")
+    
+    generator = AudioGenerator(providers=args.provider, concurrency=concurrency, hedge=args.hedge,
+                               hedge_options={
+                                   "percentile": args.hedge_percentile,
+                                   "budget": args.hedge_budget,
+                                   "initial_deadline": args.hedge_after
+                               },
+                               cassette=args.record or args.replay,
+                               cassette_mode="record" if args.record else "replay",
+                               replay_speed=args.replay_speed,
+                               split_over=args.split_over,
+                               retries=args.retries,
+                               events=args.events,
+                               shard=args.shard,
+                               catalog_msgpack=args.msgpack,
+                               schedule={
+                                   "openers": args.openers,
+                                   "episodes": args.priority,
+                                   "deadlines": deadlines
+                               })
+    
+    if args.profile or args.profile_cprofile or args.profile_memory:
+        generator.profiler = Profiler(args.slow_callback_ms, cprofile=args.profile_cprofile,
+                                      memory=args.profile_memory)
+    run = generator.profiler.run if generator.profiler else asyncio.run
     
     if args.list_episodes:
         print("Available episodes:")
@@ -362,11 +1834,60 @@ def main():
             print(f"  {ep_id}: {ep_data['title']}")
         return
     
+    if args.command == 'merge':
+        if args.shard:
+            parser.error("merge combines every shard; do not pass --shard")
+        generator.merge(episodes=args.episodes, output_dir=args.output)
+        return
+    
+    if args.watch:
+        try:
+            run(generator.watch(episodes=args.episodes, output_dir=args.output, debounce=args.debounce))
+        except KeyboardInterrupt:
+            print("\n👋 Stopped watching")
+        except FileNotFoundError as e:
+            print(f"❌ {e}")
+            sys.exit(1)
+        finally:
+            generator.close()
+        return
+    
+    if args.command == 'daemon':
+        try:
+            GenerationDaemon(generator, args.output).serve(port=args.port, socket_path=args.socket)
+        finally:
+            generator.close()
+        return
+    
+    if args.command == 'plan':
+        actions = generator.plan(episodes=args.episodes, output_dir=args.output)
+        generator.print_plan(actions)
+        if args.dry_run:
+            print()
+            generator.dry_run(generator.workload(actions=actions), output_dir=args.output)
+        elif args.execute and actions:
+            try:
+                run(generator.apply_plan(actions, output_dir=args.output))
+            finally:
+                generator.close()
+            if generator.profiler:
+                generator.profiler.save(args.output)
+        return
+    
+    if args.dry_run:
+        generator.dry_run(generator.workload(episodes=args.episodes), output_dir=args.output)
+        return
+    
     # Run generation
-    asyncio.run(generator.generate_all(
-        episodes=args.episodes,
-        output_dir=args.output
-    ))
+    try:
+        run(generator.generate_all(
+            episodes=args.episodes,
+            output_dir=args.output
+        ))
+    finally:
+        generator.close()
+    if generator.profiler:
+        generator.profiler.save(args.output)
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
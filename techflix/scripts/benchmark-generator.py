@@ -0,0 +1,443 @@
+#!/usr/bin/env python3
+"""
+Offline benchmark for the TechFlix audio generator
+Starts local stand-ins for the ElevenLabs, Gemini and Edge TTS endpoints and
+runs AudioGenerator.generate_all against them at several catalog sizes and
+concurrency levels, reporting segments/sec, p95 segment latency and peak RSS
+"""
+
+import io
+import os
+import re
+import sys
+import json
+import math
+import time
+import base64
+import random
+import struct
+import asyncio
+import hashlib
+import argparse
+import tempfile
+import threading
+import subprocess
+import contextlib
+import importlib.util
+from pathlib import Path
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from latency_stats import percentile
+
+SCRIPTS_DIR = Path(__file__).resolve().parent
+GENERATOR_SCRIPT = SCRIPTS_DIR / "audio-generator.py"
+
+# Rough encoded audio per character of narration (~15 characters per second of speech)
+MP3_BYTES_PER_CHAR = 400      # 48 kbit/s MP3
+PCM_BYTES_PER_CHAR = 3200     # 24 kHz 16-bit mono PCM
+WS_GUID = "258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+
+WORDS = ("kafka partition consumer share group broker latency throughput offset replica "
+         "rebalance stream queue message metric cluster scaling acknowledgment topic").split()
+
+
+class MockProfile:
+    """Latency distribution, chunking and throttling shared by all stand-in servers"""
+
+    def __init__(self, latency_ms=300.0, per_char_ms=2.0, sigma=0.5, chunk_bytes=16384,
+                 chunk_interval_ms=20.0, rate_429=0.0):
+        self.latency_ms = latency_ms
+        self.per_char_ms = per_char_ms
+        self.sigma = sigma
+        self.chunk_bytes = chunk_bytes
+        self.chunk_interval_ms = chunk_interval_ms
+        self.rate_429 = rate_429
+
+    def latency(self, chars):
+        """Seconds until the first byte: log-normal around a median that grows with the text"""
+        median = (self.latency_ms + self.per_char_ms * chars) / 1000
+        return median * math.exp(random.gauss(0, self.sigma))
+
+    def throttled(self):
+        return random.random() < self.rate_429
+
+    def chunks(self, size):
+        """Split size bytes of fake audio into stream chunks"""
+        payload = (b"\xff\xf3\x44\xc4" * (size // 4 + 1))[:size]
+        return [payload[i:i + self.chunk_bytes] for i in range(0, size, self.chunk_bytes)] or [b""]
+
+    def pace(self):
+        if self.chunk_interval_ms:
+            time.sleep(self.chunk_interval_ms / 1000)
+
+
+class MockServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # Clients hang up mid-response when a run is cancelled (--interrupt-after)
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+
+class MockHandler(BaseHTTPRequestHandler):
+    """Common plumbing for the stand-in servers"""
+
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    @property
+    def profile(self):
+        return self.server.profile
+
+    def read_json(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        try:
+            return json.loads(self.rfile.read(length) or b'{}')
+        except ValueError:
+            return {}
+
+    def send_json(self, status, payload):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class ElevenLabsMock(MockHandler):
+    """/v1/voices and /v1/text-to-speech/{voice_id} returning a complete MP3 body"""
+
+    def do_GET(self):
+        if self.path.rstrip('/') != '/v1/voices':
+            self.send_json(404, {"detail": "not found"})
+            return
+        self.send_json(200, {"voices": [
+            {"voice_id": "mock-narrator", "name": "Mock", "description": "professional narrator"},
+            {"voice_id": "mock-warm", "name": "Warm", "description": "warm friendly"},
+        ]})
+
+    def do_POST(self):
+        if not self.path.startswith('/v1/text-to-speech/'):
+            self.send_json(404, {"detail": "not found"})
+            return
+        text = str(self.read_json().get('text', ''))
+        if self.profile.throttled():
+            self.send_json(429, {"detail": {"status": "too_many_requests", "message": "Mock rate limit"}})
+            return
+        time.sleep(self.profile.latency(len(text)))
+        body = b"".join(self.profile.chunks(len(text) * MP3_BYTES_PER_CHAR))
+        self.send_response(200)
+        self.send_header('Content-Type', 'audio/mpeg')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class GeminiMock(MockHandler):
+    """models/{model}:streamGenerateContent?alt=sse streaming base64 PCM chunks"""
+
+    def do_POST(self):
+        if ':streamGenerateContent' not in self.path:
+            self.send_json(404, {"error": {"code": 404, "message": "not found", "status": "NOT_FOUND"}})
+            return
+        request = self.read_json()
+        try:
+            text = request['contents'][0]['parts'][0]['text']
+        except (KeyError, IndexError, TypeError):
+            text = ""
+        if self.profile.throttled():
+            self.send_json(429, {"error": {"code": 429, "message": "Resource has been exhausted",
+                                           "status": "RESOURCE_EXHAUSTED"}})
+            return
+
+        time.sleep(self.profile.latency(len(text)))
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Connection', 'close')
+        self.end_headers()
+        self.close_connection = True
+        for i, chunk in enumerate(self.profile.chunks(len(text) * PCM_BYTES_PER_CHAR)):
+            if i:
+                self.profile.pace()
+            event = {"candidates": [{"content": {"role": "model", "parts": [{"inlineData": {
+                "mimeType": "audio/L16;codec=pcm;rate=24000",
+                "data": base64.b64encode(chunk).decode()
+            }}]}}]}
+            self.wfile.write(b"data: " + json.dumps(event).encode() + b"\r\n\r\n")
+            self.wfile.flush()
+
+
+class EdgeMock(MockHandler):
+    """Edge read-aloud websocket: speech.config, ssml, then turn.start / audio / turn.end"""
+
+    def do_GET(self):
+        key = self.headers.get('Sec-WebSocket-Key')
+        if self.headers.get('Upgrade', '').lower() != 'websocket' or not key:
+            self.send_json(400, {"error": "websocket upgrade required"})
+            return
+        if self.profile.throttled():
+            self.send_json(429, {"error": "Mock rate limit"})
+            return
+
+        accept = base64.b64encode(hashlib.sha1((key + WS_GUID).encode()).digest()).decode()
+        self.send_response(101)
+        self.send_header('Upgrade', 'websocket')
+        self.send_header('Connection', 'Upgrade')
+        self.send_header('Sec-WebSocket-Accept', accept)
+        self.end_headers()
+        self.wfile.flush()
+        self.close_connection = True
+
+        while True:
+            frame = self.read_frame()
+            if frame is None:
+                return
+            opcode, payload = frame
+            if opcode == 0x8:
+                self.write_frame(0x8, payload[:2])
+                return
+            if opcode == 0x9:
+                self.write_frame(0xA, payload)
+            elif opcode == 0x1 and b"Path:ssml" in payload:
+                self.speak(payload.decode('utf-8', 'replace'))
+
+    def speak(self, ssml):
+        text = re.sub(r'<[^>]+>', '', ssml.split('\r\n\r\n', 1)[-1]).strip()
+        request_id = re.search(r'X-RequestId:(\w+)', ssml)
+        request_id = request_id.group(1) if request_id else "mock"
+
+        time.sleep(self.profile.latency(len(text)))
+        self.write_frame(0x1, (f"X-RequestId:{request_id}\r\nContent-Type:application/json; charset=utf-8\r\n"
+                               f"Path:turn.start\r\n\r\n{{}}").encode())
+        headers = f"X-RequestId:{request_id}\r\nContent-Type:audio/mpeg\r\nPath:audio\r\n".encode()
+        for i, chunk in enumerate(self.profile.chunks(len(text) * MP3_BYTES_PER_CHAR)):
+            if i:
+                self.profile.pace()
+            self.write_frame(0x2, struct.pack(">H", len(headers)) + headers + chunk)
+        self.write_frame(0x1, (f"X-RequestId:{request_id}\r\nContent-Type:application/json; charset=utf-8\r\n"
+                               f"Path:turn.end\r\n\r\n{{}}").encode())
+
+    def read_frame(self):
+        head = self.rfile.read(2)
+        if len(head) < 2:
+            return None
+        opcode, length = head[0] & 0x0F, head[1] & 0x7F
+        if length == 126:
+            length = struct.unpack(">H", self.rfile.read(2))[0]
+        elif length == 127:
+            length = struct.unpack(">Q", self.rfile.read(8))[0]
+        mask = self.rfile.read(4) if head[1] & 0x80 else b""
+        payload = self.rfile.read(length)
+        if mask:
+            # XOR with the 4-byte mask repeated over the payload
+            key = int.from_bytes((mask * (length // 4 + 1))[:length], "big")
+            payload = (int.from_bytes(payload, "big") ^ key).to_bytes(length, "big")
+        return opcode, payload
+
+    def write_frame(self, opcode, payload):
+        length = len(payload)
+        if length < 126:
+            head = struct.pack(">BB", 0x80 | opcode, length)
+        elif length < 1 << 16:
+            head = struct.pack(">BBH", 0x80 | opcode, 126, length)
+        else:
+            head = struct.pack(">BBQ", 0x80 | opcode, 127, length)
+        self.wfile.write(head + payload)
+        self.wfile.flush()
+
+
+MOCKS = {"edge": EdgeMock, "gemini": GeminiMock, "elevenlabs": ElevenLabsMock}
+
+
+def start_mocks(profile):
+    """Start one stand-in server per provider; returns the environment that points providers at them"""
+    env = {}
+    for name, handler in MOCKS.items():
+        server = MockServer(("127.0.0.1", 0), handler)
+        server.profile = profile
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        port = server.server_address[1]
+        if name == "edge":
+            env["EDGE_TTS_WSS_URL"] = (f"ws://127.0.0.1:{port}/consumer/speech/synthesize/readaloud/edge/v1"
+                                       f"?TrustedClientToken=mock")
+        elif name == "gemini":
+            env["GEMINI_BASE_URL"] = f"http://127.0.0.1:{port}/"
+            env["GEM_KEY"] = "mock-key"
+        else:
+            env["ELEVENLABS_API_BASE"] = f"http://127.0.0.1:{port}/v1"
+            env["ELEVEN_LABS_API_KEY"] = "mock-key"
+    return env
+
+
+def synthetic_catalog(segments, seed, per_episode=8):
+    """Episodes of narration-like text, the same for every run with the same seed"""
+    rng = random.Random(seed)
+    catalog = {}
+    for i in range(segments):
+        episode = catalog.setdefault(f"bench{i // per_episode:03d}", {"title": f"Benchmark {i // per_episode}", "segments": []})
+        words = [rng.choice(WORDS) for _ in range(rng.randint(20, 60))]
+        episode['segments'].append({"id": f"segment-{i:04d}", "text": " ".join(words).capitalize() + "."})
+    return catalog
+
+
+def run_case(case):
+    """Run one generate_all in this process and return its measurements"""
+    import resource
+
+    sys.path.insert(0, str(SCRIPTS_DIR))
+    spec = importlib.util.spec_from_file_location("audio_generator", GENERATOR_SCRIPT)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+
+    generator = module.AudioGenerator(provider=case['provider'], concurrency={case['provider']: case['concurrency']})
+    provider = generator.providers[0]
+    problem = provider.check()
+    if problem:
+        return {"skipped": problem}
+    if not case['rate_limits']:
+        provider.limiter.min_interval = 0.0
+    generator.scripts = synthetic_catalog(case['segments'], case['seed'])
+
+    with tempfile.TemporaryDirectory() as output_dir, contextlib.redirect_stdout(io.StringIO()):
+        if case.get('interrupt_after'):
+            return check_interrupted(generator, provider, case['interrupt_after'], output_dir)
+        start = time.perf_counter()
+        asyncio.run(generator.generate_all(output_dir=output_dir))
+        elapsed = time.perf_counter() - start
+        with open(Path(output_dir) / "manifest.json") as f:
+            statistics = json.load(f)['statistics']
+
+    latencies = sorted(seconds for _, seconds in generator.samples.get(provider.name, []))
+    # ru_maxrss is KiB on Linux and bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    peak_mb = peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+    return {
+        "generated": statistics['generated'],
+        "errors": statistics['errors'],
+        "elapsed": round(elapsed, 3),
+        "segments_per_sec": round(statistics['generated'] / elapsed, 2),
+        "p50_ms": round(percentile(latencies, 50) * 1000, 1),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 1),
+        "peak_rss_mb": round(peak_mb, 1),
+    }
+
+
+def check_interrupted(generator, provider, seconds, output_dir):
+    """Cancel generate_all after seconds, then check what the finished segments left in metadata.json"""
+    async def interrupted_run():
+        try:
+            await asyncio.wait_for(generator.generate_all(output_dir=output_dir), seconds)
+        except asyncio.TimeoutError:
+            return True
+        return False
+
+    interrupted = asyncio.run(interrupted_run())
+    openers = listed = missing = unlisted = 0
+    for episode_id, episode in generator.scripts.items():
+        ep_output_dir = Path(output_dir) / generator.episode_dir(provider, episode_id)
+        try:
+            with open(ep_output_dir / "metadata.json") as f:
+                files = {entry['file'] for entry in json.load(f)['segments']}
+            # Episode openers are scheduled first, so they are the first segments to be saved
+            openers += f"{episode['segments'][0]['id']}.{provider.extension}" in files
+        except (OSError, ValueError, KeyError):
+            files = set()
+        written = {path.name for path in ep_output_dir.glob(f"*.{provider.extension}")}
+        listed += len(files)
+        missing += len(files - written)
+        unlisted += len(written - files)
+    return {"interrupted": interrupted, "episodes": len(generator.scripts), "openers_saved": openers,
+            "listed": listed, "missing_files": missing, "unlisted_files": unlisted}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark AudioGenerator against local mock TTS providers')
+    parser.add_argument('--providers', nargs='+', choices=sorted(MOCKS), default=sorted(MOCKS),
+                        help='Providers to benchmark (default: all)')
+    parser.add_argument('--sizes', nargs='+', type=int, default=[24, 96],
+                        help='Catalog sizes in segments (default: 24 96)')
+    parser.add_argument('--concurrency', nargs='+', type=int, default=[1, 4, 16],
+                        help='Per-provider concurrency levels (default: 1 4 16)')
+    parser.add_argument('--latency-ms', type=float, default=300.0,
+                        help='Median base latency per request (default: 300)')
+    parser.add_argument('--per-char-ms', type=float, default=2.0,
+                        help='Extra median latency per character (default: 2)')
+    parser.add_argument('--sigma', type=float, default=0.5,
+                        help='Log-normal spread of latency; 0 for fixed latency (default: 0.5)')
+    parser.add_argument('--chunk-bytes', type=int, default=16384,
+                        help='Bytes per streamed audio chunk (default: 16384)')
+    parser.add_argument('--chunk-interval-ms', type=float, default=20.0,
+                        help='Delay between streamed chunks (default: 20)')
+    parser.add_argument('--rate-429', type=float, default=0.0,
+                        help='Fraction of requests answered with 429 (default: 0)')
+    parser.add_argument('--rate-limits', action='store_true',
+                        help="Keep each provider's minimum interval between requests")
+    parser.add_argument('--interrupt-after', type=float, metavar='MS',
+                        help='Cancel each run after MS and check that metadata.json lists exactly the '
+                             'segments finished so far')
+    parser.add_argument('--seed', type=int, default=1,
+                        help='Seed for the synthetic catalog (default: 1)')
+    parser.add_argument('--json', metavar='FILE',
+                        help='Also write the results as JSON to FILE')
+    parser.add_argument('--case', help=argparse.SUPPRESS)
+
+    args = parser.parse_args()
+
+    if args.case:
+        # Child process: one measurement, isolated so peak RSS belongs to this case alone
+        print(json.dumps(run_case(json.loads(args.case))))
+        return
+
+    profile = MockProfile(args.latency_ms, args.per_char_ms, args.sigma, args.chunk_bytes,
+                          args.chunk_interval_ms, args.rate_429)
+    env = dict(os.environ, **start_mocks(profile))
+
+    print(f"🏁 Generator benchmark against local mocks")
+    print(f"   Latency: {args.latency_ms:g}ms + {args.per_char_ms:g}ms/char (sigma {args.sigma:g}), "
+          f"chunks {args.chunk_bytes}B every {args.chunk_interval_ms:g}ms, 429 rate {args.rate_429:g}")
+    print(f"\n{'provider':<12}{'segments':>9}{'conc':>6}{'seg/s':>9}{'p50 ms':>10}{'p95 ms':>10}"
+          f"{'errors':>8}{'RSS MB':>9}")
+
+    results = []
+    for provider in args.providers:
+        for size in args.sizes:
+            for concurrency in args.concurrency:
+                case = {"provider": provider, "segments": size, "concurrency": concurrency,
+                        "rate_limits": args.rate_limits, "seed": args.seed,
+                        "interrupt_after": args.interrupt_after / 1000 if args.interrupt_after else None}
+                child = subprocess.run([sys.executable, __file__, '--case', json.dumps(case)],
+                                       env=env, capture_output=True, text=True)
+                try:
+                    result = json.loads(child.stdout.strip().splitlines()[-1])
+                except (IndexError, ValueError):
+                    result = {"skipped": (child.stderr.strip().splitlines() or ["no output"])[-1]}
+                results.append({**case, **result})
+
+                if 'skipped' in result:
+                    print(f"{provider:<12}{size:>9}{concurrency:>6}   ⚠️  skipped: {result['skipped']}")
+                    continue
+                if 'interrupted' in result:
+                    if not result['interrupted']:
+                        print(f"{provider:<12}{size:>9}{concurrency:>6}   ⚠️  finished before the interrupt; "
+                              f"lower --interrupt-after")
+                        continue
+                    # Every segment written before the cancel must be in metadata.json, and nothing else
+                    passed = result['listed'] and not result['missing_files'] and not result['unlisted_files']
+                    print(f"{provider:<12}{size:>9}{concurrency:>6}   {'✅' if passed else '❌'} interrupted: "
+                          f"{result['listed']} segments in metadata ({result['openers_saved']}/{result['episodes']} "
+                          f"openers), {result['unlisted_files']} unlisted, {result['missing_files']} missing files")
+                    continue
+                print(f"{provider:<12}{size:>9}{concurrency:>6}{result['segments_per_sec']:>9}"
+                      f"{result['p50_ms']:>10}{result['p95_ms']:>10}{result['errors']:>8}{result['peak_rss_mb']:>9}")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({"profile": vars(profile), "results": results}, f, indent=2)
+        print(f"\n📋 Results saved: {args.json}")
+
+if __name__ == "__main__":
+    main()
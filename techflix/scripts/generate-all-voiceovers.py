@@ -7,25 +7,24 @@ Supports ElevenLabs and Google Gemini
 import os
 import sys
 import subprocess
+import importlib.util
 from pathlib import Path
-from dotenv import load_dotenv
-
-# Load environment variables from .env file
-load_dotenv()
 
 def check_dependencies():
-    """Check if required packages are installed"""
+    """Check if required packages are installed, without importing them"""
     packages = {
         "requests": "requests",
-        "google-genai": "google-genai",
-        "python-dotenv": "python-dotenv"
+        "google.genai": "google-genai",
+        "dotenv": "python-dotenv"
     }
     
     missing = []
-    for package, pip_name in packages.items():
+    for module, pip_name in packages.items():
         try:
-            __import__(package.replace("-", "_"))
-        except ImportError:
+            found = importlib.util.find_spec(module) is not None
+        except (ImportError, ValueError):
+            found = False
+        if not found:
             missing.append(pip_name)
     
     if missing:
@@ -120,7 +119,8 @@ def main():
         print("\n⚠️  Please add your API keys to the .env file and run again")
         return
     
-    # Load environment variables
+    # Load environment variables from .env file
+    from dotenv import load_dotenv
     load_dotenv()
     
     # Show available providers
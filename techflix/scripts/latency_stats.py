@@ -0,0 +1,16 @@
+#!/usr/bin/env python3
+"""
+Latency statistics shared by the TechFlix generator, benchmark and load-test scripts
+Standard library only, so the static-server tools do not load the synthesis stack
+"""
+
+import math
+from typing import List
+
+
+def percentile(sorted_values: List[float], pct: float) -> float:
+    """Nearest-rank percentile of an ascending list; 0.0 when it is empty"""
+    if not sorted_values:
+        return 0.0
+    index = max(0, math.ceil(pct / 100 * len(sorted_values)) - 1)
+    return sorted_values[index]
@@ -0,0 +1,220 @@
+#!/usr/bin/env python3
+"""
+Load generator for the TechFlix static server (server/server-wsl.py)
+Replays the episode-start pattern of many concurrent viewers and reports
+throughput and p50/p95/p99 latency per asset class
+"""
+
+import re
+import sys
+import json
+import time
+import random
+import threading
+import argparse
+import http.client
+from urllib.parse import urlsplit, quote
+from concurrent.futures import ThreadPoolExecutor
+
+from latency_stats import percentile
+
+# Browsers open up to six HTTP/1.1 connections per host
+CONNECTIONS_PER_VIEWER = 6
+RANGE_PROBE_BYTES = 64 * 1024
+ASSET_RE = re.compile(r'(?:src|href)="(/[^"]+\.(?:js|css|mjs))"')
+
+ASSET_CLASSES = ["shell", "asset", "metadata", "segment", "range"]
+
+
+class Recorder:
+    """Collects (latency, bytes, ok) samples per asset class from all viewer threads"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.samples = {klass: [] for klass in ASSET_CLASSES}
+        self.errors = {klass: 0 for klass in ASSET_CLASSES}
+        self.bytes = {klass: 0 for klass in ASSET_CLASSES}
+
+    def record(self, klass, latency, size, ok):
+        with self.lock:
+            if ok:
+                self.samples[klass].append(latency)
+                self.bytes[klass] += size
+            else:
+                self.errors[klass] += 1
+
+
+class Viewer:
+    """One simulated viewer with its own pool of keep-alive connections"""
+
+    def __init__(self, host, port, recorder):
+        self.host = host
+        self.port = port
+        self.recorder = recorder
+        self.local = threading.local()
+        self.opened = []
+
+    def connection(self):
+        conn = getattr(self.local, 'conn', None)
+        if conn is None:
+            conn = self.local.conn = http.client.HTTPConnection(self.host, self.port, timeout=60)
+            self.opened.append(conn)
+        return conn
+
+    def get(self, klass, path, headers=None):
+        """GET path on this thread's connection and record the result; returns the body or None"""
+        start = time.perf_counter()
+        body = None
+        for attempt in range(2):
+            conn = self.connection()
+            try:
+                conn.request('GET', path, headers=headers or {})
+                response = conn.getresponse()
+                body = response.read()
+                ok = response.status in (200, 206, 304)
+                if response.getheader('Connection', '').lower() == 'close':
+                    conn.close()
+                    self.local.conn = None
+                break
+            except (http.client.HTTPException, OSError):
+                # The server may close an idle keep-alive connection; retry once on a fresh one
+                conn.close()
+                self.local.conn = None
+                ok = False
+        self.recorder.record(klass, time.perf_counter() - start, len(body or b''), ok)
+        return body if ok else None
+
+    def close(self):
+        for conn in self.opened:
+            conn.close()
+
+
+def episode_start(host, port, recorder, episode_id, connections, range_ratio):
+    """Replay what the app does when a viewer opens an episode"""
+    viewer = Viewer(host, port, recorder)
+    with ThreadPoolExecutor(max_workers=connections) as pool:
+        def fetch_all(requests):
+            list(pool.map(lambda request: viewer.get(*request), requests))
+
+        # App shell, then the scripts and stylesheets it references
+        shell = pool.submit(viewer.get, "shell", "/").result()
+        assets = sorted(set(ASSET_RE.findall(shell.decode('utf-8', 'replace')))) if shell else []
+        fetch_all([("asset", path) for path in assets])
+
+        # Episode metadata, then every voiceover segment (audioManager.preloadEpisodeVoiceovers)
+        base = f"/audio/voiceovers/{quote(episode_id)}/"
+        metadata = pool.submit(viewer.get, "metadata", base + "metadata.json").result()
+        try:
+            segments = json.loads(metadata)['segments'] if metadata else []
+        except (ValueError, KeyError, TypeError):
+            segments = []
+        files = [base + quote(segment['file']) for segment in segments if isinstance(segment, dict) and segment.get('file')]
+        fetch_all([("segment", path) for path in files])
+
+        # Media elements probe with ranged requests before and during playback
+        probes = [path for path in files if random.random() < range_ratio]
+        fetch_all([("range", path, {"Range": f"bytes=0-{RANGE_PROBE_BYTES - 1}"}) for path in probes])
+    viewer.close()
+
+
+def discover_episodes(host, port):
+    """Read the episode list from the generated voiceover manifest"""
+    conn = http.client.HTTPConnection(host, port, timeout=10)
+    try:
+        conn.request('GET', '/audio/voiceovers/manifest.json')
+        response = conn.getresponse()
+        body = response.read()
+        if response.status != 200:
+            return []
+        return list(json.loads(body).get('episodes', []))
+    except (OSError, ValueError, http.client.HTTPException):
+        return []
+    finally:
+        conn.close()
+
+
+def build_report(recorder, elapsed):
+    report = {"elapsed": round(elapsed, 3), "classes": {}}
+    total_requests = total_bytes = 0
+    for klass in ASSET_CLASSES:
+        latencies = sorted(recorder.samples[klass])
+        count = len(latencies)
+        if not count and not recorder.errors[klass]:
+            continue
+        total_requests += count
+        total_bytes += recorder.bytes[klass]
+        report["classes"][klass] = {
+            "requests": count,
+            "errors": recorder.errors[klass],
+            "requests_per_sec": round(count / elapsed, 1),
+            "mb_per_sec": round(recorder.bytes[klass] / elapsed / (1024 * 1024), 2),
+            "p50_ms": round(percentile(latencies, 50) * 1000, 2),
+            "p95_ms": round(percentile(latencies, 95) * 1000, 2),
+            "p99_ms": round(percentile(latencies, 99) * 1000, 2),
+        }
+    report["requests_per_sec"] = round(total_requests / elapsed, 1)
+    report["mb_per_sec"] = round(total_bytes / elapsed / (1024 * 1024), 2)
+    return report
+
+
+def print_report(report, args):
+    print(f"\n{'='*78}")
+    print(f"📊 {args.viewers} viewers x {args.iterations} episode starts in {report['elapsed']:.1f}s")
+    print(f"   {report['requests_per_sec']} req/s, {report['mb_per_sec']} MB/s")
+    print(f"{'='*78}")
+    print(f"{'class':<10}{'requests':>10}{'errors':>8}{'req/s':>10}{'MB/s':>9}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for klass, stats in report["classes"].items():
+        print(f"{klass:<10}{stats['requests']:>10}{stats['errors']:>8}{stats['requests_per_sec']:>10}"
+              f"{stats['mb_per_sec']:>9}{stats['p50_ms']:>10}{stats['p95_ms']:>10}{stats['p99_ms']:>10}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Load test the TechFlix static server with simulated episode starts')
+    parser.add_argument('--url', default='http://127.0.0.1:8081',
+                        help='Server base URL (default: http://127.0.0.1:8081)')
+    parser.add_argument('--episodes', nargs='+',
+                        help='Episodes to start (default: all episodes in manifest.json)')
+    parser.add_argument('--viewers', type=int, default=20,
+                        help='Concurrent simulated viewers (default: 20)')
+    parser.add_argument('--iterations', type=int, default=5,
+                        help='Episode starts per viewer (default: 5)')
+    parser.add_argument('--connections', type=int, default=CONNECTIONS_PER_VIEWER,
+                        help=f'Keep-alive connections per viewer (default: {CONNECTIONS_PER_VIEWER})')
+    parser.add_argument('--range-ratio', type=float, default=0.5,
+                        help='Fraction of segments that also get a ranged request (default: 0.5)')
+    parser.add_argument('--json', metavar='FILE',
+                        help='Also write the report as JSON to FILE')
+
+    args = parser.parse_args()
+
+    target = urlsplit(args.url)
+    host, port = target.hostname or '127.0.0.1', target.port or 80
+
+    episodes = args.episodes or discover_episodes(host, port)
+    if not episodes:
+        print("❌ No episodes found. Pass --episodes or generate public/audio/voiceovers/manifest.json")
+        sys.exit(1)
+
+    print(f"🚦 Load testing {args.url}")
+    print(f"   Viewers: {args.viewers}, iterations: {args.iterations}, episodes: {', '.join(episodes)}")
+
+    recorder = Recorder()
+
+    def viewer_loop(viewer_index):
+        for iteration in range(args.iterations):
+            episode_id = episodes[(viewer_index + iteration) % len(episodes)]
+            episode_start(host, port, recorder, episode_id, args.connections, args.range_ratio)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.viewers) as pool:
+        list(pool.map(viewer_loop, range(args.viewers)))
+    report = build_report(recorder, time.perf_counter() - start)
+
+    print_report(report, args)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"\n📋 Report saved: {args.json}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,1014 @@
+#!/usr/bin/env python3
+"""
+TTS provider plugins for the TechFlix audio generator
+Each engine implements the same async interface and registers itself by name
+"""
+
+import asyncio
+import contextlib
+import hashlib
+import heapq
+import importlib
+import importlib.util
+import itertools
+import json
+import os
+import re
+import shutil
+import struct
+import subprocess
+import tempfile
+import time
+from array import array
+from pathlib import Path
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+
+from latency_stats import percentile
+
+# Provider SDKs are imported on first use, so commands that never synthesize stay fast
+_SDK_MODULES = {}
+
+
+def sdk(module: str):
+    """Import a provider SDK module once, on first use"""
+    if module not in _SDK_MODULES:
+        _SDK_MODULES[module] = importlib.import_module(module)
+    return _SDK_MODULES[module]
+
+
+def sdk_installed(module: str) -> bool:
+    """Whether a module can be imported, without importing it"""
+    try:
+        return importlib.util.find_spec(module) is not None
+    except (ImportError, ValueError):
+        return False
+
+
+PROVIDERS: Dict[str, type] = {}
+
+
+def register_provider(cls):
+    """Class decorator that makes a provider selectable by its name"""
+    PROVIDERS[cls.name] = cls
+    return cls
+
+
+def get_provider(name: str, **options) -> "TTSProvider":
+    """Instantiate a registered provider by name"""
+    try:
+        cls = PROVIDERS[name.lower()]
+    except KeyError:
+        raise ValueError(f"Unknown provider '{name}'. Available: {', '.join(PROVIDERS)}")
+    return cls(**options)
+
+
+class ProviderError(Exception):
+    """A synthesis request failed; retryable is set for rate limits and transient errors"""
+
+    def __init__(self, message: str, status: Optional[int] = None, retryable: bool = False):
+        super().__init__(message)
+        self.status = status
+        self.retryable = retryable
+
+
+def as_provider_error(error: Exception) -> ProviderError:
+    """Wrap an SDK or transport exception, keeping any HTTP status it carries"""
+    if isinstance(error, ProviderError):
+        return error
+    status = None
+    for attribute in ("status", "code", "status_code"):
+        value = getattr(error, attribute, None)
+        if isinstance(value, int):
+            status = value
+            break
+    retryable = status is not None and (status == 429 or status >= 500)
+    return ProviderError(f"{type(error).__name__}: {error}", status=status, retryable=retryable)
+
+
+class RateLimiter:
+    """Concurrency budget for one provider: caps in-flight requests and spaces out their starts.
+
+    Free slots go to the waiting request with the smallest priority key (first come, first
+    served among equals), so the generator's scheduler decides what the provider works on next.
+    """
+
+    def __init__(self, concurrency: int, min_interval: float = 0.0):
+        self.concurrency = concurrency
+        self.active = 0
+        self.waiting = []
+        self.sequence = itertools.count()
+        self.dispatching = False
+        self.min_interval = min_interval
+        self.next_start = 0.0
+        self.lock = asyncio.Lock()
+
+    @contextlib.asynccontextmanager
+    async def slot(self, priority: tuple = ()):
+        await self.acquire(priority)
+        try:
+            yield self
+        finally:
+            self.release()
+
+    async def __aenter__(self):
+        await self.acquire()
+        return self
+
+    async def __aexit__(self, *exc_info):
+        self.release()
+
+    async def acquire(self, priority: tuple = ()):
+        waiter = asyncio.get_running_loop().create_future()
+        heapq.heappush(self.waiting, (priority, next(self.sequence), waiter))
+        self.dispatch_soon()
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                # Cancelled just after being handed a slot: pass it on
+                self.release()
+            raise
+
+        if self.min_interval:
+            try:
+                async with self.lock:
+                    now = time.monotonic()
+                    if self.next_start > now:
+                        await asyncio.sleep(self.next_start - now)
+                    self.next_start = max(now, self.next_start) + self.min_interval
+            except BaseException:
+                self.release()
+                raise
+
+    def release(self):
+        self.active -= 1
+        self.dispatch_soon()
+
+    def dispatch_soon(self):
+        # Deferred one loop turn, so requests arriving together compete on priority rather than arrival order
+        if not self.dispatching:
+            self.dispatching = True
+            asyncio.get_running_loop().call_soon(self.dispatch)
+
+    def dispatch(self):
+        self.dispatching = False
+        while self.active < self.concurrency and self.waiting:
+            _, _, waiter = heapq.heappop(self.waiting)
+            # Waiters cancelled while queued are simply skipped
+            if not waiter.done():
+                self.active += 1
+                waiter.set_result(None)
+
+
+class HedgePolicy:
+    """Decides when a slow request gets a backup request at another provider.
+
+    The deadline is a percentile of the primary provider's observed latency,
+    and backups are capped at a fraction of the characters sent to it.
+    """
+
+    def __init__(self, percentile: float = 95.0, budget: float = 0.1,
+                 initial_deadline: float = 15.0, min_samples: int = 5):
+        self.percentile = percentile
+        self.budget = budget
+        self.initial_deadline = initial_deadline
+        self.min_samples = min_samples
+        self.latencies = []
+        self.chars_sent = 0
+        self.chars_hedged = 0
+        self.hedged = 0
+        self.won = 0
+
+    def observe(self, seconds: float):
+        self.latencies.append(seconds)
+
+    def deadline(self) -> float:
+        if len(self.latencies) < self.min_samples:
+            return self.initial_deadline
+        return percentile(sorted(self.latencies), self.percentile)
+
+    def start(self, chars: int):
+        self.chars_sent += chars
+
+    def allow(self, chars: int) -> bool:
+        """Charge a backup request against the budget; False when it would exceed it"""
+        if self.chars_hedged + chars > self.budget * self.chars_sent:
+            return False
+        self.chars_hedged += chars
+        self.hedged += 1
+        return True
+
+    def stats(self) -> dict:
+        return {
+            "hedged": self.hedged,
+            "hedge_wins": self.won,
+            "hedged_chars": self.chars_hedged,
+            "deadline": round(self.deadline(), 2)
+        }
+
+
+class TTSProvider:
+    """Base class for TTS engines.
+
+    Subclasses set the class attributes describing the engine and implement
+    stream() or synthesize() (each defaults to the other).
+    """
+
+    name = ""
+    label = ""
+    extension = "mp3"
+    content_type = "audio/mpeg"
+    # Feature flags: "streaming" (audio arrives incrementally), "rate", "pitch", "voice_settings"
+    capabilities = frozenset()
+    # Longest text accepted in one request
+    max_chars = 5000
+    # Default concurrency budget and minimum seconds between request starts
+    default_concurrency = 4
+    min_interval = 0.0
+    # Rough seconds per request, used for estimates until real runs have been recorded
+    default_latency = 3.0
+    voices: Dict[str, object] = {}
+    default_voice = ""
+    # Environment variable that points the provider at another endpoint (a proxy or a local mock)
+    endpoint_env = ""
+    # SDK modules the provider imports when it first synthesizes: {module: pip package}
+    requires: Dict[str, str] = {}
+
+    def __init__(self, concurrency: Optional[int] = None, api_key: Optional[str] = None,
+                 base_url: Optional[str] = None):
+        self.concurrency = concurrency or self.default_concurrency
+        self.limiter = RateLimiter(self.concurrency, self.min_interval)
+        # Overrides the key from the environment, e.g. a second account for hedged requests
+        self.key = api_key
+        self.base_url = base_url or (os.environ.get(self.endpoint_env) if self.endpoint_env else None)
+
+    def check(self) -> Optional[str]:
+        """Return why this provider cannot run here, or None when it is ready"""
+        missing = sorted({package for module, package in self.requires.items() if not sdk_installed(module)})
+        if missing:
+            return f"{', '.join(missing)} not installed. Run: pip install {' '.join(missing)}"
+        return None
+
+    def limits(self) -> dict:
+        return {
+            "max_chars": self.max_chars,
+            "concurrency": self.concurrency,
+            "min_interval": self.min_interval,
+        }
+
+    def select_voice(self, segment_id: str, text: str) -> Tuple[str, object]:
+        """Select appropriate voice based on content"""
+        return self.default_voice, self.voices[self.default_voice]
+
+    async def synthesize(self, text: str, voice_config) -> bytes:
+        """Return the complete audio file for text"""
+        parts = [chunk async for chunk in self.stream(text, voice_config)]
+        if not parts:
+            raise ProviderError(f"{self.label} returned no audio")
+        return self.finalize(b"".join(parts))
+
+    async def stream(self, text: str, voice_config) -> AsyncIterator[bytes]:
+        """Yield playable audio bytes as they are produced"""
+        yield await self.synthesize(text, voice_config)
+
+    def finalize(self, audio_data: bytes) -> bytes:
+        """Turn the concatenated output of stream() into a complete file"""
+        return audio_data
+
+    def close(self):
+        """Release workers or connections held between requests"""
+
+
+@register_provider
+class EdgeProvider(TTSProvider):
+    """Microsoft Edge neural voices (free, no API key)"""
+
+    name = "edge"
+    label = "EDGE TTS"
+    capabilities = frozenset({"streaming", "rate", "pitch"})
+    max_chars = 10000
+    default_concurrency = 4
+    default_latency = 2.0
+    endpoint_env = "EDGE_TTS_WSS_URL"
+    voices = {
+        "primary": {"voice": "en-US-GuyNeural", "rate": "-5%", "pitch": "-2Hz"},
+        "secondary": {"voice": "en-US-AriaNeural", "rate": "-3%", "pitch": "0Hz"},
+        "technical": {"voice": "en-US-ChristopherNeural", "rate": "-8%", "pitch": "-3Hz"},
+        "energetic": {"voice": "en-US-JennyNeural", "rate": "+5%", "pitch": "+2Hz"}
+    }
+    default_voice = "primary"
+    requires = {"edge_tts": "edge-tts"}
+
+    def select_voice(self, segment_id, text):
+        if "intro" in segment_id or "conclusion" in segment_id:
+            return "primary", self.voices["primary"]
+        elif "technical" in text.lower() or "metrics" in segment_id:
+            return "technical", self.voices["technical"]
+        elif "demo" in segment_id or "action" in text.lower():
+            return "energetic", self.voices["energetic"]
+        else:
+            return "primary", self.voices["primary"]
+
+    async def stream(self, text, voice_config):
+        problem = self.check()
+        if problem:
+            raise ProviderError(problem)
+
+        edge_tts = sdk("edge_tts")
+        if self.base_url:
+            # edge-tts has no endpoint option; Communicate reads the module-level URL on each connect
+            edge_tts.communicate.WSS_URL = self.base_url
+        communicate = edge_tts.Communicate(
+            text,
+            voice_config["voice"],
+            rate=voice_config.get("rate", "-5%"),
+            pitch=voice_config.get("pitch", "0Hz")
+        )
+        async for chunk in communicate.stream():
+            if chunk["type"] == "audio" and chunk["data"]:
+                yield chunk["data"]
+
+
+@register_provider
+class GeminiProvider(TTSProvider):
+    """Google Gemini speech generation (raw PCM, saved as WAV)"""
+
+    name = "gemini"
+    label = "GEMINI TTS"
+    extension = "wav"
+    content_type = "audio/wav"
+    capabilities = frozenset({"streaming"})
+    max_chars = 4000
+    default_concurrency = 2
+    min_interval = 1.0
+    default_latency = 6.0
+    endpoint_env = "GEMINI_BASE_URL"
+    model = "gemini-2.0-flash-preview-tts"
+    voices = {
+        "narrator": "Zephyr",
+        "technical": "Charon",
+        "energetic": "Puck",
+        "friendly": "Kore",
+        "professional": "Aoede"
+    }
+    default_voice = "narrator"
+    requires = {"google.genai": "google-genai"}
+
+    def __init__(self, concurrency=None, api_key=None, base_url=None):
+        super().__init__(concurrency, api_key, base_url)
+        self.client = None
+
+    def api_key(self) -> Optional[str]:
+        return self.key or os.environ.get("GEM_KEY") or os.environ.get("GEMINI_API_KEY")
+
+    def get_client(self):
+        """The provider's genai Client, created on first use and kept so its connections stay open"""
+        if self.client is None:
+            genai, types = sdk("google.genai"), sdk("google.genai.types")
+            if self.base_url:
+                self.client = genai.Client(api_key=self.api_key(), http_options=types.HttpOptions(base_url=self.base_url))
+            else:
+                self.client = genai.Client(api_key=self.api_key())
+        return self.client
+
+    def check(self):
+        if not self.api_key():
+            return "Gemini API key not set. Use: export GEM_KEY='your-key'"
+        return super().check()
+
+    def select_voice(self, segment_id, text):
+        if "intro" in segment_id or "conclusion" in segment_id:
+            return "narrator", self.voices["narrator"]
+        elif "technical" in text.lower() or "architecture" in segment_id:
+            return "technical", self.voices["technical"]
+        elif "demo" in segment_id or "action" in text.lower():
+            return "energetic", self.voices["energetic"]
+        else:
+            return "narrator", self.voices["narrator"]
+
+    async def stream(self, text, voice_name):
+        problem = self.check()
+        if problem:
+            raise ProviderError(problem)
+
+        client = self.get_client()
+        types = sdk("google.genai.types")
+        contents = [
+            types.Content(
+                role="user",
+                parts=[types.Part.from_text(text=text)]
+            )
+        ]
+        config = types.GenerateContentConfig(
+            temperature=0.7,
+            response_modalities=["audio"],
+            speech_config=types.SpeechConfig(
+                voice_config=types.VoiceConfig(
+                    prebuilt_voice_config=types.PrebuiltVoiceConfig(
+                        voice_name=voice_name
+                    )
+                )
+            )
+        )
+
+        stream = iter(client.models.generate_content_stream(
+            model=self.model,
+            contents=contents,
+            config=config,
+        ))
+        header_sent = False
+        while True:
+            # The SDK stream is blocking; pull each chunk on a worker thread
+            chunk = await asyncio.to_thread(next, stream, None)
+            if chunk is None:
+                break
+            if not (chunk.candidates and
+                    chunk.candidates[0].content and
+                    chunk.candidates[0].content.parts and
+                    chunk.candidates[0].content.parts[0].inline_data):
+                continue
+
+            inline_data = chunk.candidates[0].content.parts[0].inline_data
+            if not inline_data.data:
+                continue
+            if not header_sent:
+                # Sizes are unknown until the stream ends; finalize() fills them in
+                yield wav_header(0xFFFFFFFF - 36, inline_data.mime_type)
+                header_sent = True
+            yield inline_data.data
+
+    def finalize(self, audio_data):
+        if audio_data[:4] == b"RIFF" and len(audio_data) >= 44:
+            audio_data = bytearray(audio_data)
+            struct.pack_into("<I", audio_data, 4, len(audio_data) - 8)
+            struct.pack_into("<I", audio_data, 40, len(audio_data) - 44)
+            audio_data = bytes(audio_data)
+        return audio_data
+
+    def close(self):
+        if self.client is not None:
+            self.client.close()
+            self.client = None
+
+
+@register_provider
+class ElevenLabsProvider(TTSProvider):
+    """ElevenLabs text-to-speech REST API"""
+
+    name = "elevenlabs"
+    label = "ElevenLabs"
+    capabilities = frozenset({"voice_settings"})
+    max_chars = 5000
+    default_concurrency = 2
+    min_interval = 0.5
+    api_base_url = "https://api.elevenlabs.io/v1"
+    endpoint_env = "ELEVENLABS_API_BASE"
+    model = "eleven_monolingual_v1"
+    # Voice types map to a description preference used to pick from the account's voices
+    voices = {
+        "narrator": {"preference": "professional"},
+        "warm": {"preference": "warm"},
+        "authoritative": {"preference": "authoritative"}
+    }
+    default_voice = "narrator"
+    requires = {"requests": "requests"}
+    voice_settings = {
+        "stability": 0.75,  # Higher for consistent narration
+        "similarity_boost": 0.75,
+        "style": 0.0,  # Lower for neutral narration
+        "use_speaker_boost": True
+    }
+
+    def __init__(self, concurrency=None, api_key=None, base_url=None):
+        super().__init__(concurrency, api_key, base_url)
+        self.api_base_url = (self.base_url or self.api_base_url).rstrip("/")
+        self.account_voices = None
+        self.voice_lock = asyncio.Lock()
+        self.session = None
+
+    def api_key(self) -> Optional[str]:
+        return self.key or os.environ.get("ELEVEN_LABS_API_KEY") or os.environ.get("ELEVENLABS_API_KEY")
+
+    def check(self):
+        if not self.api_key():
+            return "ElevenLabs API key not set. Use: export ELEVEN_LABS_API_KEY='your-key'"
+        return super().check()
+
+    def get_session(self):
+        """A requests.Session reused for every call, so TLS connections to the API are kept alive"""
+        if self.session is None:
+            requests = sdk("requests")
+            self.session = requests.Session()
+            # One pooled connection per concurrent request
+            adapter = requests.adapters.HTTPAdapter(pool_maxsize=self.concurrency)
+            self.session.mount("https://", adapter)
+            self.session.mount("http://", adapter)
+        return self.session
+
+    async def voice_id(self, voice_config) -> str:
+        """Resolve a voice config to an ElevenLabs voice id, fetching the voice list once"""
+        if voice_config.get("voice_id"):
+            return voice_config["voice_id"]
+        if os.environ.get("ELEVENLABS_VOICE_ID"):
+            return os.environ["ELEVENLABS_VOICE_ID"]
+
+        async with self.voice_lock:
+            if self.account_voices is None:
+                response = await asyncio.to_thread(
+                    self.get_session().get, f"{self.api_base_url}/voices",
+                    headers={"Accept": "application/json", "xi-api-key": self.api_key()}, timeout=30
+                )
+                if response.status_code != 200:
+                    raise ProviderError(f"Error getting voices: {response.status_code}", status=response.status_code,
+                                        retryable=response.status_code == 429 or response.status_code >= 500)
+                self.account_voices = response.json()["voices"]
+
+        if not self.account_voices:
+            raise ProviderError("No voices available. Check API key.")
+        preference = voice_config.get("preference", "professional")
+        keywords = {
+            "professional": ("professional", "narrator"),
+            "warm": ("warm", "friendly"),
+            "authoritative": ("authoritative", "confident"),
+        }.get(preference, (preference,))
+        for voice in self.account_voices:
+            desc = voice.get('description', '').lower()
+            if any(keyword in desc for keyword in keywords):
+                return voice['voice_id']
+        return self.account_voices[0]['voice_id']
+
+    async def synthesize(self, text, voice_config):
+        problem = self.check()
+        if problem:
+            raise ProviderError(problem)
+
+        voice_id = await self.voice_id(voice_config)
+        response = await asyncio.to_thread(
+            self.get_session().post,
+            f"{self.api_base_url}/text-to-speech/{voice_id}",
+            json={
+                "text": text,
+                "model_id": self.model,
+                "voice_settings": voice_config.get("settings", self.voice_settings)
+            },
+            headers={
+                "Accept": "audio/mpeg",
+                "Content-Type": "application/json",
+                "xi-api-key": self.api_key()
+            },
+            timeout=30
+        )
+        if response.status_code != 200:
+            raise ProviderError(f"Error {response.status_code}: {response.text[:200]}", status=response.status_code,
+                                retryable=response.status_code == 429 or response.status_code >= 500)
+        return response.content
+
+    def close(self):
+        if self.session is not None:
+            self.session.close()
+            self.session = None
+
+
+@register_provider
+class LocalProvider(TTSProvider):
+    """On-box synthesis with espeak-ng or pyttsx3, fanned out over a process pool.
+
+    Draft quality, but needs no network, API key or rate limit. The engine is
+    picked from LOCAL_TTS_ENGINE, else espeak-ng, espeak, then pyttsx3.
+    """
+
+    name = "local"
+    label = "LOCAL TTS"
+    extension = "wav"
+    content_type = "audio/wav"
+    capabilities = frozenset({"rate", "pitch", "offline"})
+    max_chars = 20000
+    default_concurrency = os.cpu_count() or 2
+    default_latency = 0.5
+    # Voice types follow the roles of the "Offline Only" preset in ttsConfigManager.js
+    voices = {
+        "narrator": {"espeak": "en-us", "pyttsx3": "system_default", "rate": 165, "pitch": 45},
+        "technical": {"espeak": "en-us+m3", "pyttsx3": "system_male", "rate": 155, "pitch": 40},
+        "dramatic": {"espeak": "en-us+m7", "pyttsx3": "system_male", "rate": 175, "pitch": 55},
+        "alternate": {"espeak": "en-us+f3", "pyttsx3": "system_female", "rate": 165, "pitch": 50}
+    }
+    default_voice = "narrator"
+
+    def __init__(self, concurrency=None, api_key=None, base_url=None):
+        super().__init__(concurrency, api_key, base_url)
+        self.engine = self.find_engine()
+        self.pool = None
+
+    @staticmethod
+    def find_engine() -> Optional[str]:
+        preferred = os.environ.get("LOCAL_TTS_ENGINE")
+        for engine in ([preferred] if preferred else ["espeak-ng", "espeak", "pyttsx3"]):
+            if engine == "pyttsx3":
+                if sdk_installed("pyttsx3"):
+                    return engine
+            elif shutil.which(engine):
+                return engine
+        return None
+
+    def check(self):
+        if not self.engine:
+            return "No local TTS engine found. Install espeak-ng or run: pip install pyttsx3"
+        return None
+
+    def select_voice(self, segment_id, text):
+        if "intro" in segment_id or "conclusion" in segment_id:
+            return "narrator", self.voices["narrator"]
+        elif "technical" in text.lower() or "metrics" in segment_id:
+            return "technical", self.voices["technical"]
+        elif "demo" in segment_id or "action" in text.lower():
+            return "dramatic", self.voices["dramatic"]
+        else:
+            return "narrator", self.voices["narrator"]
+
+    async def synthesize(self, text, voice_config):
+        problem = self.check()
+        if problem:
+            raise ProviderError(problem)
+
+        if self.pool is None:
+            from concurrent.futures import ProcessPoolExecutor
+            # Synthesis is CPU-bound, so one worker process per concurrent request
+            self.pool = ProcessPoolExecutor(max_workers=self.concurrency)
+        loop = asyncio.get_running_loop()
+        try:
+            return await loop.run_in_executor(self.pool, local_synthesize, self.engine, text, voice_config)
+        except (OSError, RuntimeError, subprocess.SubprocessError) as e:
+            raise ProviderError(f"{self.engine} failed: {e}")
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.shutdown()
+            self.pool = None
+
+
+_PYTTSX3_ENGINE = None
+
+
+def local_synthesize(engine: str, text: str, voice_config: dict) -> bytes:
+    """Process-pool worker: synthesize text with a local engine and return WAV bytes"""
+    if engine != "pyttsx3":
+        result = subprocess.run(
+            [engine, "--stdout", "--stdin", "-v", voice_config["espeak"],
+             "-s", str(voice_config["rate"]), "-p", str(voice_config["pitch"])],
+            input=text.encode(), capture_output=True, timeout=300
+        )
+        if result.returncode != 0 or not result.stdout:
+            raise RuntimeError(result.stderr.decode(errors="replace").strip() or f"exit code {result.returncode}")
+        return result.stdout
+
+    # pyttsx3 drives the platform engine in-process; keep one per worker
+    global _PYTTSX3_ENGINE
+    import pyttsx3
+    if _PYTTSX3_ENGINE is None:
+        _PYTTSX3_ENGINE = pyttsx3.init()
+    tts = _PYTTSX3_ENGINE
+    wanted = voice_config["pyttsx3"]
+    if wanted != "system_default":
+        gender = wanted.split("_", 1)[1]
+        for voice in tts.getProperty("voices"):
+            description = f"{voice.name} {voice.id} {getattr(voice, 'gender', '')}".lower()
+            # "female" contains "male", so strip it before looking for male voices
+            if gender in (description if gender == "female" else description.replace("female", "")):
+                tts.setProperty("voice", voice.id)
+                break
+    tts.setProperty("rate", voice_config["rate"])
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "speech.wav")
+        tts.save_to_file(text, path)
+        tts.runAndWait()
+        with open(path, "rb") as f:
+            return f.read()
+
+
+class CassetteProvider:
+    """Wraps a provider to record its traffic to a cassette directory or replay it offline.
+
+    Each request key is stored as <provider>/<key>.json, listing every attempt
+    made for it in order (outcome, status, chunk offsets and sizes), with the
+    audio of attempt n in <key>.<n>.audio. A 429 followed by a successful retry
+    is therefore kept as two attempts. Replay needs no SDK, key or network and
+    hands out the recorded attempts in order, reproducing their chunks, errors
+    and timing; after the last one it repeats it. speed scales the timing and 0
+    replays instantly.
+    """
+
+    def __init__(self, provider: TTSProvider, directory, mode: str = "replay", speed: float = 1.0):
+        if mode not in ("record", "replay"):
+            raise ValueError(f"Cassette mode must be record or replay, not '{mode}'")
+        self.provider = provider
+        self.directory = Path(directory) / provider.name
+        self.mode = mode
+        self.speed = speed
+        # Record: the attempts made for each key in this run. Replay: the next attempt to hand out
+        self.attempts = {}
+        self.cursors = {}
+
+    def __getattr__(self, name):
+        return getattr(self.provider, name)
+
+    def check(self):
+        if self.mode == "replay":
+            return None if self.directory.is_dir() else f"No cassettes recorded in {self.directory}"
+        return self.provider.check()
+
+    def key(self, text: str, voice_config) -> str:
+        request = json.dumps([self.provider.name, text, voice_config], sort_keys=True)
+        return hashlib.sha256(request.encode()).hexdigest()[:32]
+
+    async def synthesize(self, text: str, voice_config) -> bytes:
+        parts = [chunk async for chunk in self.stream(text, voice_config)]
+        if not parts:
+            raise ProviderError(f"{self.provider.label} returned no audio")
+        return self.provider.finalize(b"".join(parts))
+
+    async def stream(self, text: str, voice_config) -> AsyncIterator[bytes]:
+        key = self.key(text, voice_config)
+        if self.mode == "replay":
+            async for chunk in self.replay(key, text):
+                yield chunk
+        else:
+            async for chunk in self.record(key, text, voice_config):
+                yield chunk
+
+    async def record(self, key: str, text: str, voice_config) -> AsyncIterator[bytes]:
+        # The first attempt for a key in this run starts a new sequence, replacing an older recording
+        attempts = self.attempts.setdefault(key, [])
+        entry = {"recorded": time.strftime("%Y-%m-%d %H:%M:%S"), "outcome": "ok", "chunks": [],
+                 "audio": f"{key}.{len(attempts)}.audio"}
+        attempts.append(entry)
+        audio = []
+        start = time.monotonic()
+        # Non-streaming providers are recorded as one chunk of the finished file
+        source = (self.provider.stream(text, voice_config) if "streaming" in self.provider.capabilities
+                  else self.single(text, voice_config))
+        # Cancellation (e.g. the losing side of a hedge) is a BaseException and leaves no recording
+        try:
+            async for chunk in source:
+                entry['chunks'].append([round(time.monotonic() - start, 4), len(chunk)])
+                audio.append(chunk)
+                yield chunk
+        except ProviderError as e:
+            entry.update(outcome="error", error=str(e), status=e.status, retryable=e.retryable)
+            self.save(key, text, voice_config, entry, b"".join(audio), start)
+            raise
+        except Exception as e:
+            entry.update(outcome="error", error=f"{type(e).__name__}: {e}")
+            self.save(key, text, voice_config, entry, b"".join(audio), start)
+            raise
+        self.save(key, text, voice_config, entry, b"".join(audio), start)
+
+    async def single(self, text: str, voice_config) -> AsyncIterator[bytes]:
+        yield await self.provider.synthesize(text, voice_config)
+
+    async def replay(self, key: str, text: str) -> AsyncIterator[bytes]:
+        try:
+            with open(self.directory / f"{key}.json") as f:
+                cassette = json.load(f)
+            # Cassettes recorded before attempt sequences hold one attempt at the top level
+            attempts = cassette.get('attempts') or [{**cassette, "audio": f"{key}.audio"}]
+            index = self.cursors.get(key, 0)
+            self.cursors[key] = index + 1
+            entry = attempts[min(index, len(attempts) - 1)]
+            audio = (self.directory / entry['audio']).read_bytes() if entry.get('audio') else b""
+        except (OSError, ValueError, KeyError, IndexError):
+            raise ProviderError(f"No cassette for {self.provider.name} text '{text[:40]}...'")
+
+        start = time.monotonic()
+        position = 0
+        for offset, size in entry['chunks']:
+            await self.wait_until(start, offset)
+            yield audio[position:position + size]
+            position += size
+        if entry['outcome'] == "error":
+            await self.wait_until(start, entry.get('elapsed', 0))
+            raise ProviderError(entry.get('error', "recorded error"), status=entry.get('status'),
+                                retryable=entry.get('retryable', False))
+
+    async def wait_until(self, start: float, offset: float):
+        if self.speed > 0:
+            delay = start + offset / self.speed - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+
+    def save(self, key: str, text: str, voice_config, entry: dict, audio: bytes, start: float):
+        """Write entry's audio, then the key's sequence of finished attempts"""
+        entry['elapsed'] = round(time.monotonic() - start, 4)
+        if not audio:
+            entry['audio'] = None
+        cassette = {"provider": self.provider.name, "text": text, "voice": voice_config,
+                    "attempts": [attempt for attempt in self.attempts[key] if 'elapsed' in attempt]}
+        self.directory.mkdir(parents=True, exist_ok=True)
+        files = ([(entry['audio'], audio)] if audio else []) + [(f"{key}.json", json.dumps(cassette, indent=2).encode())]
+        for name, data in files:
+            # Unique per writer: shards recording into one cassette may save the same key at once
+            tmp = self.directory / f".{name}.{os.getpid()}-{os.urandom(4).hex()}.tmp"
+            tmp.write_bytes(data)
+            os.replace(tmp, self.directory / name)
+
+
+def wav_header(data_size: int, mime_type: str) -> bytes:
+    """Build a 16-bit mono PCM WAV header for data_size bytes of audio"""
+    # Extract sample rate from mime type
+    rate = 24000
+    if mime_type:
+        parts = mime_type.split(";")
+        for param in parts:
+            if param.strip().lower().startswith("rate="):
+                try:
+                    rate = int(param.split("=", 1)[1])
+                except ValueError:
+                    pass
+
+    # Create WAV header
+    num_channels = 1
+    bits_per_sample = 16
+    bytes_per_sample = bits_per_sample // 8
+    block_align = num_channels * bytes_per_sample
+    byte_rate = rate * block_align
+    chunk_size = 36 + data_size
+
+    return struct.pack(
+        "<4sI4s4sIHHIIHH4sI",
+        b"RIFF", chunk_size, b"WAVE", b"fmt ", 16, 1,
+        num_channels, rate, byte_rate, block_align,
+        bits_per_sample, b"data", data_size
+    )
+
+
+# Splits only on the whitespace after a sentence end, so closing quotes and brackets stay with their sentence
+SENTENCE_RE = re.compile(r'(?<=[.!?…]["\')\]])\s+|(?<=[.!?…])\s+')
+CLAUSE_RE = re.compile(r'(?<=[,;:—])\s+')
+# Sentences shorter than this are joined with their neighbours so each request has enough context for prosody
+MIN_CHUNK_CHARS = 80
+# Pause kept between stitched sentences once their own leading/trailing silence is trimmed
+SENTENCE_PAUSE = 0.18
+SILENCE_LEVEL = 400
+
+
+def split_text(text: str, max_chars: int, split_over: Optional[int] = None) -> List[str]:
+    """Split text at sentence boundaries into chunks of at most max_chars.
+
+    Text within max_chars stays whole unless it is longer than split_over,
+    in which case it is split into sentences so they can be synthesized in
+    parallel. Sentences longer than max_chars are split at clauses, then words.
+    """
+    text = text.strip()
+    if len(text) <= max_chars and (split_over is None or len(text) <= split_over):
+        return [text]
+
+    pieces = []
+    for sentence in SENTENCE_RE.split(text):
+        if len(sentence) <= max_chars:
+            pieces.append(sentence)
+            continue
+        for clause in CLAUSE_RE.split(sentence):
+            while len(clause) > max_chars:
+                cut = clause.rfind(" ", 0, max_chars)
+                cut = cut if cut > 0 else max_chars
+                pieces.append(clause[:cut])
+                clause = clause[cut:].lstrip()
+            pieces.append(clause)
+
+    chunks = []
+    for piece in pieces:
+        if chunks and len(chunks[-1]) < MIN_CHUNK_CHARS and len(chunks[-1]) + 1 + len(piece) <= max_chars:
+            chunks[-1] += " " + piece
+        else:
+            chunks.append(piece)
+    if len(chunks) > 1 and len(chunks[-1]) < MIN_CHUNK_CHARS and len(chunks[-2]) + 1 + len(chunks[-1]) <= max_chars:
+        chunks[-2] += " " + chunks.pop()
+    return [chunk for chunk in chunks if chunk.strip()]
+
+
+def stitch_audio(extension: str, parts: List[bytes]) -> bytes:
+    """Join separately synthesized pieces of one segment into a single file"""
+    if len(parts) == 1:
+        return parts[0]
+    if extension == "wav":
+        return stitch_wav(parts)
+    return stitch_mp3(parts)
+
+
+def parse_wav(audio: bytes) -> Tuple[bytes, bytes]:
+    """Return (fmt chunk body, PCM data); streamed WAVs may carry placeholder sizes"""
+    if audio[:4] != b"RIFF" or audio[8:12] != b"WAVE":
+        raise ProviderError("Cannot stitch audio that is not WAV")
+    fmt, offset = None, 12
+    while offset + 8 <= len(audio):
+        chunk_id, size = struct.unpack_from("<4sI", audio, offset)
+        body = offset + 8
+        if chunk_id == b"data":
+            # The data chunk runs to the end of the file when its size was never filled in
+            return fmt, audio[body:min(len(audio), body + size)]
+        if chunk_id == b"fmt ":
+            fmt = audio[body:body + size]
+        offset = body + size + (size & 1)
+    raise ProviderError("WAV audio has no data chunk")
+
+
+def silent_samples(samples: array, reverse: bool = False) -> int:
+    """Number of near-silent samples at the start (or end) of samples"""
+    indices = range(len(samples) - 1, -1, -1) if reverse else range(len(samples))
+    count = 0
+    for i in indices:
+        if abs(samples[i]) > SILENCE_LEVEL:
+            break
+        count += 1
+    return count
+
+
+def stitch_wav(parts: List[bytes]) -> bytes:
+    """Concatenate PCM, replacing the silence at each join with one fixed sentence pause"""
+    fmt, first = parse_wav(parts[0])
+    channels, rate, bits = struct.unpack_from("<HI", fmt, 2) + struct.unpack_from("<H", fmt, 14)
+    pieces = [first] + [parse_wav(part)[1] for part in parts[1:]]
+
+    if bits != 16:
+        return wav_from_fmt(fmt, b"".join(pieces))
+
+    frame = channels
+    pause = array("h", bytes(int(rate * SENTENCE_PAUSE) * frame * 2))
+    out = array("h")
+    for i, piece in enumerate(pieces):
+        samples = array("h")
+        samples.frombytes(piece[:len(piece) - len(piece) % 2])
+        # Trim whole frames only, so channels stay interleaved
+        lead = silent_samples(samples) // frame * frame if i > 0 else 0
+        tail = silent_samples(samples, reverse=True) // frame * frame if i < len(pieces) - 1 else 0
+        if i > 0:
+            out.extend(pause)
+        out.extend(samples[lead:len(samples) - tail])
+    return wav_from_fmt(fmt, out.tobytes())
+
+
+def wav_from_fmt(fmt: bytes, data: bytes) -> bytes:
+    return (struct.pack("<4sI4s", b"RIFF", 4 + 8 + len(fmt) + 8 + len(data), b"WAVE")
+            + struct.pack("<4sI", b"fmt ", len(fmt)) + fmt
+            + struct.pack("<4sI", b"data", len(data)) + data)
+
+
+def stitch_mp3(parts: List[bytes]) -> bytes:
+    """Concatenate MP3 frame streams, dropping the ID3 tags that would sit mid-stream"""
+    out = []
+    for i, part in enumerate(parts):
+        if i > 0 and part[:3] == b"ID3" and len(part) >= 10:
+            # ID3v2 size is a 28-bit synchsafe integer, plus a 10-byte footer when flagged
+            size = (part[6] << 21) | (part[7] << 14) | (part[8] << 7) | part[9]
+            part = part[10 + size + (10 if part[5] & 0x10 else 0):]
+        if i < len(parts) - 1 and len(part) >= 128 and part[-128:-125] == b"TAG":
+            part = part[:-128]
+        out.append(part)
+    return b"".join(out)
+
+
+# MPEG audio Layer III frame header tables, indexed by the header's version bits
+MP3_BITRATES = {
+    3: (0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320),
+    2: (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160),
+}
+MP3_SAMPLE_RATES = {3: (44100, 48000, 32000), 2: (22050, 24000, 16000), 0: (11025, 12000, 8000)}
+
+
+def audio_duration(extension: str, audio: bytes) -> Optional[float]:
+    """Playback length in seconds of WAV or MP3 audio, or None when it cannot be read"""
+    if extension == "wav":
+        try:
+            fmt, data = parse_wav(audio)
+        except ProviderError:
+            return None
+        byte_rate = struct.unpack_from("<I", fmt, 8)[0] if fmt and len(fmt) >= 12 else 0
+        return len(data) / byte_rate if byte_rate else None
+    if extension == "mp3":
+        return mp3_duration(audio)
+    return None
+
+
+def mp3_duration(audio: bytes) -> Optional[float]:
+    """Sum the Layer III frames; provider MP3s carry no reliable length field"""
+    offset = 0
+    if audio[:3] == b"ID3" and len(audio) >= 10:
+        offset = 10 + ((audio[6] << 21) | (audio[7] << 14) | (audio[8] << 7) | audio[9])
+    seconds = 0.0
+    while offset + 4 <= len(audio):
+        b1, b2 = audio[offset + 1], audio[offset + 2]
+        version, layer = (b1 >> 3) & 3, (b1 >> 1) & 3
+        bitrate_index, rate_index = b2 >> 4, (b2 >> 2) & 3
+        if (audio[offset] != 0xFF or b1 & 0xE0 != 0xE0 or version == 1 or layer != 1
+                or bitrate_index in (0, 15) or rate_index == 3):
+            # Not a frame header (a trailing tag or junk): resynchronize on the next sync byte
+            offset = audio.find(b"\xff", offset + 1)
+            if offset < 0:
+                break
+            continue
+        bitrate = MP3_BITRATES[3 if version == 3 else 2][bitrate_index] * 1000
+        rate = MP3_SAMPLE_RATES[version][rate_index]
+        # MPEG-1 frames hold 1152 samples, MPEG-2 and 2.5 frames 576
+        samples = 1152 if version == 3 else 576
+        seconds += samples / rate
+        offset += samples // 8 * bitrate // rate + ((b2 >> 1) & 1)
+    return seconds or None
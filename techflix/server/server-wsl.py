@@ -1,58 +1,1196 @@
 #!/usr/bin/env python3
+import http
 import http.server
-import socketserver
 import os
+import re
+import json
+import gzip
+import hashlib
+import mmap
+import stat
+import time
+import random
+import threading
+import sys
+import queue
+import atexit
+import argparse
+import asyncio
+import importlib.util
+import email.utils
 import subprocess
 import socket
+from collections import OrderedDict
+from pathlib import Path
+from urllib.parse import quote
 
 PORT = 8081
 DIRECTORY = "dist"
 
+# Single "bytes=start-end" range; multi-range requests are answered with the full file
+RANGE_RE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+# Hot-asset cache: small files are kept in memory, mid-size files are mmapped,
+# anything larger is streamed from disk with sendfile
+CACHE_SMALL_FILE_MAX = 256 * 1024
+CACHE_MMAP_FILE_MAX = 16 * 1024 * 1024
+CACHE_MEMORY_BUDGET = 64 * 1024 * 1024
+CACHE_MMAP_MAX_ENTRIES = 64
+STAT_CACHE_TTL = 1.0
+
+# HTTP/1.1 persistent connections: idle connections are closed after
+# KEEPALIVE_TIMEOUT seconds, and after KEEPALIVE_MAX_REQUESTS responses
+KEEPALIVE_TIMEOUT = 5
+KEEPALIVE_MAX_REQUESTS = 100
+
+# Prometheus-style metrics and buffered access logging
+METRICS_PATH = "/__metrics"
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+ACCESS_LOG_FLUSH_INTERVAL = 1.0
+ACCESS_LOG_BATCH_SIZE = 256
+
+# Voiceover segments advertised with Link: rel=preload on each episode's metadata.json
+VOICEOVER_METADATA_RE = re.compile(r"^/audio/voiceovers/([^/]+)/metadata\.json$")
+PRELOAD_SEGMENTS = 4
+
+# Voiceover metadata + effects library for one episode in a single response
+AUDIO_BUNDLE_RE = re.compile(r"^/api/episodes/([A-Za-z0-9_-]+)/audio-bundle$")
+
+# Network emulation profiles: latency and jitter in seconds are added before
+# each response, bandwidth in bytes/sec paces the response bytes per connection
+NET_PROFILES = {
+    "slow-3g": {"latency": 0.4, "jitter": 0.1, "bandwidth": 400_000 // 8},
+    "3g": {"latency": 0.15, "jitter": 0.05, "bandwidth": 1_600_000 // 8},
+    "4g": {"latency": 0.05, "jitter": 0.02, "bandwidth": 9_000_000 // 8},
+    "hotel-wifi": {"latency": 0.08, "jitter": 0.12, "bandwidth": 1_000_000 // 8},
+    "dsl": {"latency": 0.025, "jitter": 0.005, "bandwidth": 5_000_000 // 8},
+}
+NET_CHUNK_SIZE = 16 * 1024
+
+# On-demand synthesis: audio is streamed while the provider produces it and
+# written into the voiceover layout (<output>/<episode>/<segment>.<ext> + metadata.json)
+SYNTH_PATH = "/api/synthesize"
+# Relative to the served directory, so stored segments are served under /audio/voiceovers
+SYNTH_OUTPUT = "audio/voiceovers"
+SYNTH_PREVIEW_EPISODE = "_previews"
+GENERATOR_SCRIPT = Path(__file__).resolve().parent.parent / "scripts" / "audio-generator.py"
+SAFE_NAME_RE = re.compile(r"^[A-Za-z0-9_-]+$")
+
+
+class CachedBody:
+    """In-memory (bytes or mmap) response body; close() is a no-op so the cache keeps it"""
+
+    def __init__(self, data):
+        self.data = data
+
+    def close(self):
+        pass
+
+
+class FileCache:
+    """Thread-safe stat, path-translation and content cache shared by all handlers.
+
+    Stat results are reused for STAT_CACHE_TTL seconds. When a refreshed stat
+    shows the file changed (mtime, size or inode), its cached content is
+    dropped and reloaded on the next request.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.paths = OrderedDict()   # url path -> filesystem path
+        self.stats = {}              # filesystem path -> (stat_result or None, checked_at)
+        self.memory = OrderedDict()  # filesystem path -> (signature, CachedBody)
+        self.maps = OrderedDict()    # filesystem path -> (signature, CachedBody)
+        self.memory_bytes = 0
+
+    @staticmethod
+    def signature(st):
+        return (st.st_mtime_ns, st.st_size, st.st_ino)
+
+    def translate(self, url_path, translate):
+        key = url_path.split('?', 1)[0].split('#', 1)[0]
+        with self.lock:
+            path = self.paths.get(key)
+            if path is not None:
+                self.paths.move_to_end(key)
+                return path
+        path = translate(url_path)
+        with self.lock:
+            self.paths[key] = path
+            if len(self.paths) > 4096:
+                self.paths.popitem(last=False)
+        return path
+
+    def stat(self, path):
+        """Return the (possibly cached) stat_result for path, or None if it does not exist"""
+        now = time.monotonic()
+        with self.lock:
+            cached = self.stats.get(path)
+            if cached and now - cached[1] < STAT_CACHE_TTL:
+                return cached[0]
+        try:
+            st = os.stat(path)
+        except OSError:
+            st = None
+        with self.lock:
+            self.stats[path] = (st, now)
+            if len(self.stats) > 4096:
+                self.stats.pop(next(iter(self.stats)))
+            if st is None or (cached and cached[0] and self.signature(cached[0]) != self.signature(st)):
+                self._drop(path)
+        return st
+
+    def open(self, path, st):
+        """Return (body, stat_result) for a regular file.
+
+        body is a CachedBody when cacheable, else a file object. Files too big
+        for the memory store are re-stat'ed first: one rewritten in place within
+        STAT_CACHE_TTL would otherwise be sent from a mapping of truncated pages
+        (EFAULT, 0 bytes). The returned stat_result is the one body matches, so
+        callers must take Content-Length from it rather than from st.
+        """
+        if st.st_size > CACHE_SMALL_FILE_MAX:
+            st = self.refresh(path, st)
+            store = self.memory if st.st_size <= CACHE_SMALL_FILE_MAX else self.maps
+        else:
+            store = self.memory
+        sig = self.signature(st)
+        if st.st_size <= CACHE_MMAP_FILE_MAX:
+            with self.lock:
+                entry = store.get(path)
+                if entry and entry[0] == sig:
+                    store.move_to_end(path)
+                    return entry[1], st
+
+        f = open(path, 'rb')
+        st = os.fstat(f.fileno())
+        size = st.st_size
+        if size > CACHE_MMAP_FILE_MAX:
+            return f, st
+
+        store = self.memory if size <= CACHE_SMALL_FILE_MAX else self.maps
+        with f:
+            if store is self.memory:
+                body = CachedBody(f.read(size))
+            else:
+                # The mapping stays valid after the file is closed; it is released
+                # by the garbage collector once evicted and no longer being sent
+                body = CachedBody(mmap.mmap(f.fileno(), size, access=mmap.ACCESS_READ))
+
+        with self.lock:
+            self._drop(path)
+            store[path] = (self.signature(st), body)
+            if store is self.memory:
+                self.memory_bytes += len(body.data)
+                while self.memory_bytes > CACHE_MEMORY_BUDGET and len(self.memory) > 1:
+                    _, (_, evicted) = self.memory.popitem(last=False)
+                    self.memory_bytes -= len(evicted.data)
+            else:
+                while len(self.maps) > CACHE_MMAP_MAX_ENTRIES:
+                    self.maps.popitem(last=False)
+        return body, st
+
+    def refresh(self, path, st):
+        """Stat path now, bypassing the TTL; drops cached content if it changed since st"""
+        fresh = os.stat(path)
+        if self.signature(fresh) != self.signature(st):
+            with self.lock:
+                self.stats[path] = (fresh, time.monotonic())
+                self._drop(path)
+        return fresh
+
+    def _drop(self, path):
+        entry = self.memory.pop(path, None)
+        if entry:
+            self.memory_bytes -= len(entry[1].data)
+        self.maps.pop(path, None)
+
+    def clear(self):
+        with self.lock:
+            self.paths.clear()
+            self.stats.clear()
+            self.memory.clear()
+            self.maps.clear()
+            self.memory_bytes = 0
+
+
+FILE_CACHE = FileCache()
+
+
+class PreloadHints:
+    """Per-episode Link header values built from voiceover metadata.json.
+
+    The first segments in scene order (the order metadata.json lists them)
+    are advertised so the browser starts fetching audio while it is still
+    parsing the metadata. Cached until metadata.json changes.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.links = {}  # episode id -> ((signature, count), link or None)
+
+    def get(self, episode_id, path, st, count):
+        key = (FileCache.signature(st), count)
+        with self.lock:
+            cached = self.links.get(episode_id)
+            if cached and cached[0] == key:
+                return cached[1]
+
+        try:
+            body, _ = FILE_CACHE.open(path, st)
+            if isinstance(body, CachedBody):
+                metadata = json.loads(bytes(body.data))
+            else:
+                with body:
+                    metadata = json.load(body)
+            segments = metadata.get('segments', [])
+        except (OSError, ValueError, AttributeError):
+            segments = []
+
+        files = [seg['file'] for seg in segments if isinstance(seg, dict) and seg.get('file')][:count]
+        link = ", ".join(
+            f"</audio/voiceovers/{quote(episode_id)}/{quote(name)}>; rel=preload; as=audio"
+            for name in files
+        ) or None
+
+        with self.lock:
+            self.links[episode_id] = (key, link)
+        return link
+
+
+PRELOAD_HINTS = PreloadHints()
+
+
+def file_etag(st):
+    return f'"{st.st_mtime_ns:x}-{st.st_size:x}"'
+
+
+class AudioBundles:
+    """Merged per-episode audio documents, cached until a source JSON or a referenced file changes.
+
+    A bundle holds the episode's voiceover metadata.json and effects
+    sound-library.json together with the size and ETag of every audio file
+    they reference, pre-serialized and pre-gzipped. The ETags match the ones
+    static responses send, so clients can revalidate each file with them.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.bundles = {}  # episode id -> (key, file signatures, etag, body, gzipped body)
+
+    @staticmethod
+    def file_signatures(paths):
+        """Signatures of the referenced files; audio regenerated without a metadata change alters them"""
+        return tuple((path, FileCache.signature(st) if st else None)
+                     for path, st in ((path, FILE_CACHE.stat(path)) for path in paths))
+
+    def get(self, handler, episode_id):
+        """Return (etag, body, gzipped body), or None when the episode has no voiceover metadata"""
+        sources = {
+            'voiceovers': (f"/audio/voiceovers/{episode_id}/", "metadata.json"),
+            'effects': (f"/audio/effects/{episode_id}/", "sound-library.json"),
+        }
+        stats = {}
+        for name, (base, filename) in sources.items():
+            path = handler.translate_path(base + filename)
+            st = FILE_CACHE.stat(path)
+            stats[name] = (path, st if st is not None and stat.S_ISREG(st.st_mode) else None)
+        if stats['voiceovers'][1] is None:
+            return None
+
+        key = tuple(FileCache.signature(st) if st else None for _, st in stats.values())
+        with self.lock:
+            cached = self.bundles.get(episode_id)
+        if cached and cached[0] == key and self.file_signatures(path for path, _ in cached[1]) == cached[1]:
+            return cached[2:]
+
+        bundle = {"episode_id": episode_id, "voiceovers": None, "effects": None, "files": {}}
+        for name, (path, st) in stats.items():
+            if st is None:
+                continue
+            try:
+                with open(path, 'rb') as f:
+                    bundle[name] = json.load(f)
+            except (OSError, ValueError):
+                continue
+
+        referenced = []
+        voiceovers = bundle['voiceovers'] or {}
+        if isinstance(voiceovers, dict):
+            for segment in voiceovers.get('segments', []):
+                if isinstance(segment, dict) and segment.get('file'):
+                    referenced.append(sources['voiceovers'][0] + segment['file'])
+        effects = bundle['effects'] or {}
+        if isinstance(effects, dict):
+            for category in (effects.get('effects') or {}).values():
+                for effect in (category.values() if isinstance(category, dict) else []):
+                    if isinstance(effect, dict) and effect.get('file'):
+                        referenced.append(sources['effects'][0] + effect['file'])
+
+        paths = [handler.translate_path(url) for url in referenced]
+        for url, path in zip(referenced, paths):
+            st = FILE_CACHE.stat(path)
+            if st is not None and stat.S_ISREG(st.st_mode):
+                bundle['files'][url] = {"size": st.st_size, "etag": file_etag(st)}
+
+        body = json.dumps(bundle, separators=(',', ':')).encode()
+        etag = f'"{hashlib.sha1(body).hexdigest()[:20]}"'
+        entry = (key, self.file_signatures(paths), etag, body, gzip.compress(body, 6))
+        with self.lock:
+            self.bundles[episode_id] = entry
+        return entry[2:]
+
+
+AUDIO_BUNDLES = AudioBundles()
+
+
+class SynthesisCache:
+    """Loads AudioGenerator on first use and serializes work per output file and per provider.
+
+    A second request for a segment that is being synthesized waits for the
+    first one and is then served from disk. Each handler thread runs its own
+    event loop, and a provider's limiter and locks must not be shared between
+    loops running at once, so synthesis with one provider runs one at a time.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.module = None
+        self.generators = {}
+        self.file_locks = {}
+        self.provider_locks = {}
+
+    def generator(self, provider):
+        """AudioGenerator for one provider; raises ValueError for an unknown provider name"""
+        with self.lock:
+            if self.module is None:
+                # audio-generator.py imports its provider plugins from the scripts directory
+                if str(GENERATOR_SCRIPT.parent) not in sys.path:
+                    sys.path.insert(0, str(GENERATOR_SCRIPT.parent))
+                spec = importlib.util.spec_from_file_location("audio_generator", GENERATOR_SCRIPT)
+                module = importlib.util.module_from_spec(spec)
+                spec.loader.exec_module(module)
+                self.module = module
+            if provider not in self.generators:
+                self.generators[provider] = self.module.AudioGenerator(provider=provider)
+            return self.generators[provider]
+
+    def file_lock(self, path):
+        with self.lock:
+            return self.file_locks.setdefault(str(path), threading.Lock())
+
+    def provider_lock(self, provider):
+        with self.lock:
+            return self.provider_locks.setdefault(provider, threading.Lock())
+
+    @staticmethod
+    def cached_segment(output_file, segment_id, text, voice_type):
+        """True when metadata.json records this exact text and voice for an existing file"""
+        try:
+            with open(output_file.parent / "metadata.json") as f:
+                metadata = json.load(f)
+        except (OSError, ValueError):
+            return False
+        for segment in metadata.get('segments', []):
+            if segment.get('id') == segment_id:
+                return (segment.get('file') == output_file.name and segment.get('text') == text
+                        and segment.get('voice') == voice_type and output_file.is_file())
+        return False
+
+    def store(self, generator, output_file, episode_id, segment_id, text, voice_type, audio):
+        """Write the audio and its metadata.json entry, each via an atomic rename.
+
+        The metadata update holds the generator's output lock, like the
+        generator's own writers of the same files.
+        """
+        output_file.parent.mkdir(parents=True, exist_ok=True)
+        self.module.write_bytes_atomic(output_file, audio)
+
+        with self.module.output_lock(output_file.parent.parent):
+            self.update_metadata(generator, output_file, episode_id, segment_id, text, voice_type)
+
+    def update_metadata(self, generator, output_file, episode_id, segment_id, text, voice_type):
+        metadata_file = output_file.parent / "metadata.json"
+        try:
+            with open(metadata_file) as f:
+                metadata = json.load(f)
+        except (OSError, ValueError):
+            metadata = {
+                "episode_id": episode_id,
+                "title": generator.scripts.get(episode_id, {}).get('title', episode_id),
+                "provider": generator.providers[0].label,
+                "segments": []
+            }
+        metadata['generated'] = time.strftime("%Y-%m-%d %H:%M:%S")
+        entry = {"id": segment_id, "file": output_file.name, "text": text, "voice": voice_type}
+        segments = metadata.setdefault('segments', [])
+        for i, segment in enumerate(segments):
+            if segment.get('id') == segment_id:
+                segments[i] = entry
+                break
+        else:
+            segments.append(entry)
+
+        self.module.write_json_atomic(metadata_file, metadata)
+
+
+SYNTHESIS = SynthesisCache()
+
+
+def path_class(path):
+    """Bucket a request path into a small fixed set of labels for latency histograms"""
+    path = path.split('?', 1)[0]
+    ext = os.path.splitext(path)[1].lower()
+    if path == METRICS_PATH:
+        return "metrics"
+    if path.startswith('/api/'):
+        return "api"
+    if path.startswith('/audio/'):
+        return "audio-metadata" if ext == '.json' else "audio"
+    if ext in ('', '.html'):
+        return "html"
+    if ext in ('.js', '.mjs', '.css', '.map'):
+        return "asset"
+    if ext in ('.png', '.jpg', '.jpeg', '.gif', '.svg', '.webp', '.ico'):
+        return "image"
+    if ext == '.json':
+        return "json"
+    return "other"
+
+
+class Metrics:
+    """Thread-safe request counters and latency histograms rendered in Prometheus text format"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.requests = {}   # (method, status) -> count
+        self.latency = {}    # path class -> [bucket counts..., sum, count]
+        self.bytes_sent = 0
+        self.connections = 0
+        self.started = time.time()
+
+    def connection_opened(self):
+        with self.lock:
+            self.connections += 1
+
+    def connection_closed(self):
+        with self.lock:
+            self.connections -= 1
+
+    def add_bytes(self, n):
+        with self.lock:
+            self.bytes_sent += n
+
+    def observe(self, method, status, klass, seconds):
+        with self.lock:
+            key = (method, status)
+            self.requests[key] = self.requests.get(key, 0) + 1
+            hist = self.latency.get(klass)
+            if hist is None:
+                hist = self.latency[klass] = [0] * (len(LATENCY_BUCKETS) + 2)
+            for i, bound in enumerate(LATENCY_BUCKETS):
+                if seconds <= bound:
+                    hist[i] += 1
+            hist[-2] += seconds
+            hist[-1] += 1
+
+    def render(self):
+        with self.lock:
+            lines = [
+                "# HELP techflix_requests_total HTTP requests by method and status code.",
+                "# TYPE techflix_requests_total counter",
+            ]
+            for (method, status), count in sorted(self.requests.items()):
+                lines.append(f'techflix_requests_total{{method="{method}",code="{status}"}} {count}')
+
+            lines += [
+                "# HELP techflix_request_duration_seconds Request latency by path class.",
+                "# TYPE techflix_request_duration_seconds histogram",
+            ]
+            for klass, hist in sorted(self.latency.items()):
+                for bound, count in zip(LATENCY_BUCKETS, hist):
+                    lines.append(f'techflix_request_duration_seconds_bucket{{class="{klass}",le="{bound}"}} {count}')
+                lines.append(f'techflix_request_duration_seconds_bucket{{class="{klass}",le="+Inf"}} {hist[-1]}')
+                lines.append(f'techflix_request_duration_seconds_sum{{class="{klass}"}} {hist[-2]:.6f}')
+                lines.append(f'techflix_request_duration_seconds_count{{class="{klass}"}} {hist[-1]}')
+
+            lines += [
+                "# HELP techflix_response_bytes_total Bytes written to clients, headers included.",
+                "# TYPE techflix_response_bytes_total counter",
+                f"techflix_response_bytes_total {self.bytes_sent}",
+                "# HELP techflix_connections_in_flight Open client connections.",
+                "# TYPE techflix_connections_in_flight gauge",
+                f"techflix_connections_in_flight {self.connections}",
+                "# HELP techflix_start_time_seconds Unix time the server started.",
+                "# TYPE techflix_start_time_seconds gauge",
+                f"techflix_start_time_seconds {self.started:.0f}",
+            ]
+
+        with FILE_CACHE.lock:
+            lines += [
+                "# HELP techflix_file_cache_entries Files held by the hot-asset cache.",
+                "# TYPE techflix_file_cache_entries gauge",
+                f'techflix_file_cache_entries{{store="memory"}} {len(FILE_CACHE.memory)}',
+                f'techflix_file_cache_entries{{store="mmap"}} {len(FILE_CACHE.maps)}',
+                "# HELP techflix_file_cache_memory_bytes Bytes held in memory by the hot-asset cache.",
+                "# TYPE techflix_file_cache_memory_bytes gauge",
+                f"techflix_file_cache_memory_bytes {FILE_CACHE.memory_bytes}",
+            ]
+        return ("\n".join(lines) + "\n").encode()
+
+
+METRICS = Metrics()
+
+
+class AccessLog:
+    """Buffered access log: request threads enqueue lines, a background thread writes them in batches"""
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.queue = queue.SimpleQueue()
+        self.thread = threading.Thread(target=self._run, name="access-log", daemon=True)
+        self.thread.start()
+        atexit.register(self.flush)
+
+    def write(self, line):
+        self.queue.put(line)
+
+    def _drain(self, first=None):
+        batch = [] if first is None else [first]
+        while len(batch) < ACCESS_LOG_BATCH_SIZE:
+            try:
+                batch.append(self.queue.get_nowait())
+            except queue.Empty:
+                break
+        if batch:
+            self.stream.write("".join(batch))
+            self.stream.flush()
+        return len(batch)
+
+    def _run(self):
+        while True:
+            try:
+                first = self.queue.get(timeout=ACCESS_LOG_FLUSH_INTERVAL)
+            except queue.Empty:
+                continue
+            self._drain(first)
+
+    def flush(self):
+        while self._drain():
+            pass
+
+
+ACCESS_LOG = AccessLog(sys.stderr)
+
+
+class CountingWriter:
+    """Wraps the handler's wfile so every byte written to the client is counted"""
+
+    def __init__(self, raw):
+        self.raw = raw
+
+    def write(self, data):
+        n = self.raw.write(data)
+        METRICS.add_bytes(len(data))
+        return n
+
+    def flush(self):
+        self.raw.flush()
+
+    def __getattr__(self, name):
+        return getattr(self.raw, name)
+
+
+class ShapedWriter:
+    """Paces writes to the profile's bandwidth; a passthrough while profile is None.
+
+    One instance per connection, so every connection gets its own bandwidth
+    budget. The profile is chosen per request from the path.
+    """
+
+    def __init__(self, raw):
+        self.raw = raw
+        self.profile = None
+        self.next_send = 0.0
+
+    def write(self, data):
+        bandwidth = self.profile and self.profile.get('bandwidth')
+        if not bandwidth:
+            return self.raw.write(data)
+
+        view = memoryview(data).cast('B')
+        for start in range(0, len(view), NET_CHUNK_SIZE):
+            chunk = view[start:start + NET_CHUNK_SIZE]
+            now = time.monotonic()
+            if self.next_send > now:
+                time.sleep(self.next_send - now)
+            self.raw.write(chunk)
+            self.next_send = max(self.next_send, now) + len(chunk) / bandwidth
+        return len(view)
+
+    def flush(self):
+        self.raw.flush()
+
+    def __getattr__(self, name):
+        return getattr(self.raw, name)
+
+
+def parse_net_profile(spec):
+    """Resolve a profile name, or 'off', to a profile dict (None = no shaping)"""
+    if spec in ('off', 'none'):
+        return None
+    if spec not in NET_PROFILES:
+        raise argparse.ArgumentTypeError(f"unknown network profile '{spec}' (choose from: off, {', '.join(NET_PROFILES)})")
+    return dict(NET_PROFILES[spec])
+
+
+def describe_net_profile(profile):
+    if not profile:
+        return "off"
+    parts = [f"{profile.get('latency', 0) * 1000:.0f}ms ±{profile.get('jitter', 0) * 1000:.0f}ms latency"]
+    if profile.get('bandwidth'):
+        parts.append(f"{profile['bandwidth'] * 8 / 1000:.0f} kbit/s")
+    return ", ".join(parts)
+
+
+def parse_net_override(spec):
+    """Parse a '--net-path PREFIX=PROFILE' override"""
+    prefix, sep, profile = spec.partition('=')
+    if not sep or not prefix.startswith('/'):
+        raise argparse.ArgumentTypeError(f"expected /path/prefix=PROFILE, got '{spec}'")
+    return prefix, parse_net_profile(profile)
+
+
 class CORSRequestHandler(http.server.SimpleHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    timeout = KEEPALIVE_TIMEOUT
+    disable_nagle_algorithm = True
+
     def __init__(self, *args, **kwargs):
+        # (offset, length) of the body to send for the current request, None = whole file
+        self.byte_range = None
+        self.chunked = False
+        self.requests_on_connection = 0
+        self.status_code = None
+        self.request_start = None
         super().__init__(*args, directory=DIRECTORY, **kwargs)
-    
+
+    def setup(self):
+        super().setup()
+        self.shaper = ShapedWriter(self.wfile)
+        self.wfile = CountingWriter(self.shaper)
+        METRICS.connection_opened()
+
+    def finish(self):
+        try:
+            super().finish()
+        finally:
+            METRICS.connection_closed()
+
+    def handle_one_request(self):
+        self.requests_on_connection += 1
+        self.chunked = False
+        self.command = None
+        self.status_code = None
+        self.request_start = None
+        try:
+            super().handle_one_request()
+        finally:
+            if self.command and self.request_start is not None:
+                METRICS.observe(self.command, self.status_code or 0, path_class(self.path),
+                                time.perf_counter() - self.request_start)
+
+    def parse_request(self):
+        self.request_start = time.perf_counter()
+        if not super().parse_request():
+            return False
+        self.emulate_network()
+        return True
+
+    def emulate_network(self):
+        """Pick the network profile for this path and apply its request latency"""
+        path = self.path.split('?', 1)[0]
+        profile = self.server.net_profile
+        matched = ''
+        for prefix, override in self.server.net_overrides:
+            if path.startswith(prefix) and len(prefix) > len(matched):
+                matched, profile = prefix, override
+
+        self.shaper.profile = profile
+        if profile:
+            delay = profile.get('latency', 0) + random.uniform(-1, 1) * profile.get('jitter', 0)
+            if delay > 0:
+                time.sleep(delay)
+
+    def log_request(self, code='-', size='-'):
+        if isinstance(code, http.HTTPStatus):
+            code = code.value
+        self.status_code = code
+        super().log_request(code, size)
+
+    def log_message(self, format, *args):
+        ACCESS_LOG.write("%s - - [%s] %s\n" % (self.address_string(), self.log_date_time_string(), format % args))
+
     def end_headers(self):
+        if not self.close_connection:
+            if self.requests_on_connection >= KEEPALIVE_MAX_REQUESTS:
+                self.send_header('Connection', 'close')
+            elif self.request_version == 'HTTP/1.0':
+                # HTTP/1.0 clients only stay connected when they asked for keep-alive
+                self.send_header('Connection', 'keep-alive')
+            if not self.close_connection:
+                self.send_header('Keep-Alive', f'timeout={KEEPALIVE_TIMEOUT}, max={KEEPALIVE_MAX_REQUESTS - self.requests_on_connection}')
         self.send_header('Access-Control-Allow-Origin', '*')
         self.send_header('Access-Control-Allow-Methods', 'GET, POST, OPTIONS')
         self.send_header('Access-Control-Allow-Headers', 'Content-Type')
+        self.send_header('Access-Control-Expose-Headers', 'X-Synthesis-Cache')
         self.send_header('Cache-Control', 'no-cache, no-store, must-revalidate')
         super().end_headers()
 
     def do_OPTIONS(self):
         self.send_response(200)
+        self.send_header('Content-Length', '0')
         self.end_headers()
 
+    def begin_chunked(self):
+        """Announce a response body of unknown length; call before end_headers().
+
+        HTTP/1.1 clients get Transfer-Encoding: chunked and the connection stays
+        open. HTTP/1.0 has no chunked coding, so the body is delimited by
+        closing the connection instead.
+        """
+        if self.request_version == 'HTTP/1.0':
+            self.send_header('Connection', 'close')
+            self.chunked = False
+        else:
+            self.send_header('Transfer-Encoding', 'chunked')
+            self.chunked = True
+
+    def write_chunk(self, data):
+        if not data:
+            return
+        if self.chunked:
+            self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+        else:
+            self.wfile.write(data)
+
+    def end_chunked(self):
+        if self.chunked:
+            self.wfile.write(b"0\r\n\r\n")
+            self.chunked = False
+
+    def translate_path(self, path):
+        return FILE_CACHE.translate(path, super().translate_path)
+
+    def send_head(self):
+        """Serve regular files from FILE_CACHE with single byte-range support.
+
+        Directories, missing files and anything else fall through to
+        SimpleHTTPRequestHandler.
+        """
+        self.byte_range = None
+        if self.path.split('?', 1)[0] == METRICS_PATH:
+            return self.send_body(200, METRICS.render(), 'text/plain; version=0.0.4; charset=utf-8')
+
+        match = AUDIO_BUNDLE_RE.match(self.path.split('?', 1)[0])
+        if match:
+            return self.send_audio_bundle(match.group(1))
+
+        if self.path.split('?', 1)[0] == SYNTH_PATH:
+            # Synthesis has side effects, so GET/HEAD never start one; only POST does
+            self.send_response(405)
+            self.send_header('Allow', 'POST, OPTIONS')
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return None
+
+        path = self.translate_path(self.path)
+        st = FILE_CACHE.stat(path)
+        if st is None or not stat.S_ISREG(st.st_mode) or path.endswith('/'):
+            return super().send_head()
+
+        if self.not_modified_since(st):
+            self.send_response(304)
+            self.send_header('ETag', file_etag(st))
+            self.end_headers()
+            return None
+
+        try:
+            body, st = FILE_CACHE.open(path, st)
+        except (OSError, ValueError):
+            self.send_error(404, "File not found")
+            return None
+
+        size = st.st_size
+        start, end = 0, size - 1
+        match = RANGE_RE.match(self.headers.get('Range', '').strip())
+        if match and not match.group(1) == match.group(2) == "":
+            first, last = match.groups()
+            if first:
+                start = int(first)
+                end = min(int(last), size - 1) if last else size - 1
+            else:
+                # Suffix range: the final N bytes
+                start = max(size - int(last), 0)
+
+            if start >= size or start > end:
+                if not isinstance(body, CachedBody):
+                    body.close()
+                self.send_response(416)
+                self.send_header('Accept-Ranges', 'bytes')
+                self.send_header('Content-Range', f'bytes */{size}')
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+                return None
+            self.byte_range = (start, end - start + 1)
+
+        link = None
+        match = VOICEOVER_METADATA_RE.match(self.path.split('?', 1)[0])
+        if match and not self.byte_range and self.server.preload_segments > 0:
+            link = PRELOAD_HINTS.get(match.group(1), path, st, self.server.preload_segments)
+            if link and self.server.early_hints and self.request_version != 'HTTP/1.0':
+                self.wfile.write(f"{self.protocol_version} 103 Early Hints\r\nLink: {link}\r\n\r\n".encode('latin-1'))
+
+        if self.byte_range:
+            self.send_response(206)
+            self.send_header('Content-Range', f'bytes {start}-{end}/{size}')
+        else:
+            self.send_response(200)
+        self.send_header('Content-Type', self.guess_type(path))
+        self.send_header('Content-Length', str(end - start + 1))
+        self.send_header('Last-Modified', self.date_time_string(st.st_mtime))
+        self.send_header('ETag', file_etag(st))
+        # Ranges are only supported for static files, not API, metrics or error responses
+        self.send_header('Accept-Ranges', 'bytes')
+        if link:
+            self.send_header('Link', link)
+        self.end_headers()
+        return body
+
+    def send_body(self, code, data, content_type):
+        """Send headers for an in-memory body and return it for copyfile()"""
+        self.send_response(code)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        return CachedBody(data)
+
+    def send_audio_bundle(self, episode_id):
+        bundle = AUDIO_BUNDLES.get(self, episode_id)
+        if bundle is None:
+            self.send_error(404, "No voiceover metadata for episode")
+            return None
+
+        etag, body, gzipped = bundle
+        if etag in self.headers.get('If-None-Match', ''):
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.end_headers()
+            return None
+
+        if 'gzip' in self.headers.get('Accept-Encoding', ''):
+            body = gzipped
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        if body is gzipped:
+            self.send_header('Content-Encoding', 'gzip')
+        self.send_header('Vary', 'Accept-Encoding')
+        self.send_header('ETag', etag)
+        self.end_headers()
+        return CachedBody(body)
+
+    def do_POST(self):
+        self.byte_range = None
+        if self.path.split('?', 1)[0] != SYNTH_PATH:
+            self.send_error(404, "Not found")
+            return
+
+        length = self.headers.get('Content-Length')
+        if length is None:
+            self.send_error(411, "Content-Length required")
+            return
+        try:
+            params = json.loads(self.rfile.read(int(length)) or b'{}')
+        except ValueError:
+            self.send_error(400, "Request body must be JSON")
+            return
+        if not isinstance(params, dict):
+            self.send_error(400, "Request body must be a JSON object")
+            return
+
+        body = self.send_synthesis(params)
+        if body:
+            try:
+                self.copyfile(body, self.wfile)
+            finally:
+                body.close()
+
+    def send_synthesis(self, params):
+        """Synthesize text with AudioGenerator, streaming the audio with chunked encoding.
+
+        Params: text (required), provider (a registered provider plugin), voice
+        (a key of the provider's voices, chosen by select_voice when omitted),
+        episode and segment (where to store it; defaults to a preview slot
+        named after the content). A previously stored identical segment is
+        returned from disk.
+        """
+        text = str(params.get('text', '')).strip()
+        provider = str(params.get('provider', 'edge')).lower()
+        if not text:
+            self.send_error(400, "Missing text")
+            return None
+
+        try:
+            generator = SYNTHESIS.generator(provider)
+        except ValueError as e:
+            self.send_error(400, str(e))
+            return None
+        except Exception as e:
+            self.send_error(500, f"Could not load audio generator: {e}")
+            return None
+
+        engine = generator.providers[0]
+        voices = engine.voices
+        voice_type = params.get('voice')
+        episode_id = str(params.get('episode') or SYNTH_PREVIEW_EPISODE)
+        digest = hashlib.sha1(f"{provider}|{voice_type}|{text}".encode()).hexdigest()[:12]
+        segment_id = str(params.get('segment') or f"preview-{digest}")
+        if not SAFE_NAME_RE.match(episode_id) or not SAFE_NAME_RE.match(segment_id):
+            self.send_error(400, "Episode and segment may only contain letters, digits, '-' and '_'")
+            return None
+        if voice_type is None:
+            voice_type, voice_config = engine.select_voice(segment_id, text)
+        elif voice_type in voices:
+            voice_config = voices[voice_type]
+        else:
+            self.send_error(400, f"Unknown voice; choose from: {', '.join(voices)}")
+            return None
+
+        content_type = engine.content_type
+        output_file = Path(self.server.synth_output) / episode_id / f"{segment_id}.{engine.extension}"
+
+        with SYNTHESIS.file_lock(output_file):
+            if SYNTHESIS.cached_segment(output_file, segment_id, text, voice_type):
+                try:
+                    f = open(output_file, 'rb')
+                except OSError:
+                    pass
+                else:
+                    self.send_response(200)
+                    self.send_header('Content-Type', content_type)
+                    self.send_header('Content-Length', str(os.fstat(f.fileno()).st_size))
+                    self.send_header('X-Synthesis-Cache', 'hit')
+                    self.end_headers()
+                    return f
+
+            with SYNTHESIS.provider_lock(provider):
+                audio = asyncio.run(self.stream_synthesis(engine, text, voice_config, content_type))
+            if audio:
+                SYNTHESIS.store(generator, output_file, episode_id, segment_id, text, voice_type,
+                                engine.finalize(audio))
+        return None
+
+    async def stream_synthesis(self, engine, text, voice_config, content_type):
+        """Relay the provider's stream() chunks to the client; returns the complete audio or None on failure"""
+        chunks = engine.stream(text, voice_config)
+        try:
+            first = await chunks.__anext__()
+        except StopAsyncIteration:
+            self.send_error(502, "Provider returned no audio")
+            return None
+        except Exception as e:
+            self.send_error(502, f"Synthesis failed: {e}")
+            return None
+
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('X-Synthesis-Cache', 'miss')
+        self.begin_chunked()
+        self.end_headers()
+
+        parts = [first]
+        try:
+            async for chunk in self.relay(first, chunks):
+                parts.append(chunk)
+        except Exception as e:
+            self.log_error("Synthesis stream failed: %s", e)
+            self.close_connection = True
+            return None
+
+        return b"".join(parts)
+
+    async def relay(self, first, chunks):
+        """Write the first and every following chunk to the client, yielding the later ones.
+
+        If the client disconnects, synthesis continues so the result still
+        fills the cache.
+        """
+        connected = self.try_write_chunk(first)
+        async for chunk in chunks:
+            if connected:
+                connected = self.try_write_chunk(chunk)
+            yield chunk
+        if connected:
+            try:
+                self.end_chunked()
+            except OSError:
+                self.close_connection = True
+
+    def try_write_chunk(self, data):
+        try:
+            self.write_chunk(data)
+            return True
+        except OSError:
+            self.close_connection = True
+            return False
+
+    def not_modified_since(self, st):
+        if 'If-None-Match' in self.headers:
+            # Takes precedence over If-Modified-Since; weak comparison, as for GET
+            tags = {tag.strip().removeprefix('W/') for tag in self.headers['If-None-Match'].split(',')}
+            return '*' in tags or file_etag(st) in tags
+        if 'If-Modified-Since' not in self.headers:
+            return False
+        try:
+            ims = email.utils.parsedate_to_datetime(self.headers['If-Modified-Since'])
+        except (TypeError, IndexError, OverflowError, ValueError):
+            return False
+        if ims.tzinfo is None:
+            return False
+        return int(st.st_mtime) <= ims.timestamp()
+
+    def copyfile(self, source, outputfile):
+        """Send the response body without copying it through Python where possible.
+
+        Cached bodies are written straight from memory or the mmap. Files on
+        disk go through socket.sendfile(), which uses os.sendfile() on Linux
+        and only falls back to a buffered send() loop where zero-copy is not
+        available.
+        """
+        if outputfile is not self.wfile:
+            return super().copyfile(source, outputfile)
+
+        offset, count = self.byte_range or (0, None)
+        if isinstance(source, CachedBody):
+            view = memoryview(source.data)
+            try:
+                outputfile.write(view[offset:offset + count] if count is not None else view[offset:])
+            finally:
+                view.release()
+            return
+
+        if self.shaper.profile:
+            # Paced responses are written in chunks instead of sendfile()
+            source.seek(offset)
+            remaining = count
+            while remaining is None or remaining > 0:
+                chunk = source.read(64 * 1024 if remaining is None else min(64 * 1024, remaining))
+                if not chunk:
+                    break
+                outputfile.write(chunk)
+                if remaining is not None:
+                    remaining -= len(chunk)
+            return
+
+        METRICS.add_bytes(self.connection.sendfile(source, offset, count))
+
 Handler = CORSRequestHandler
 
-# Get WSL IP
-try:
-    wsl_ip = subprocess.check_output(['hostname', '-I']).decode().strip().split()[0]
-except:
-    wsl_ip = "WSL IP not found"
-
-# Get Windows host IP (usually the default gateway in WSL2)
-try:
-    windows_ip = subprocess.check_output(['ip', 'route', 'show']).decode()
-    windows_ip = windows_ip.split('default via ')[1].split()[0]
-except:
-    windows_ip = "Windows IP not found"
-
-print("\n🚀 TechFlix Server Starting...\n")
-print(f"Server will run on port {PORT}")
-print(f"Serving directory: {os.path.abspath(DIRECTORY)}\n")
-print("=" * 50)
-print("Access TechFlix from Windows browser at:")
-print(f"  http://localhost:{PORT}")
-print(f"  http://127.0.0.1:{PORT}")
-print(f"  http://{wsl_ip}:{PORT}")
-print("\nIf localhost doesn't work in Windows:")
-print("1. Try the WSL IP address directly")
-print("2. Check Windows Firewall settings")
-print("3. Run this PowerShell command as Admin:")
-print(f"   netsh interface portproxy add v4tov4 listenport={PORT} listenaddress=0.0.0.0 connectport={PORT} connectaddress={wsl_ip}")
-print("=" * 50)
-print("\nPress Ctrl+C to stop the server\n")
-
-with socketserver.TCPServer(("0.0.0.0", PORT), Handler) as httpd:
-    httpd.serve_forever()
\ No newline at end of file
+class TechFlixServer(http.server.ThreadingHTTPServer):
+    # Keep-alive connections each hold a thread until they go idle
+    daemon_threads = True
+    allow_reuse_address = True
+    request_queue_size = 128
+
+    # Overridden from the command line in main()
+    preload_segments = PRELOAD_SEGMENTS
+    early_hints = False
+    net_profile = None
+    net_overrides = ()
+    synth_output = os.path.join(DIRECTORY, SYNTH_OUTPUT)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Serve the TechFlix build for WSL / local development')
+    parser.add_argument('--port', type=int, default=PORT,
+                        help=f'Port to listen on (default: {PORT})')
+    parser.add_argument('--preload-segments', type=int, default=PRELOAD_SEGMENTS,
+                        help=f'Voiceover segments to advertise with Link: rel=preload, 0 disables (default: {PRELOAD_SEGMENTS})')
+    parser.add_argument('--early-hints', action='store_true',
+                        help='Also send the preload links in a 103 Early Hints response')
+    parser.add_argument('--net', type=parse_net_profile, default=None, metavar='PROFILE',
+                        help=f'Emulate a network for every response: {", ".join(NET_PROFILES)}')
+    parser.add_argument('--net-latency', type=float, metavar='MS',
+                        help='Added latency per request in milliseconds (overrides the profile)')
+    parser.add_argument('--net-bandwidth', type=float, metavar='KBPS',
+                        help='Response bandwidth per connection in kbit/s (overrides the profile)')
+    parser.add_argument('--net-jitter', type=float, metavar='MS',
+                        help='Random +/- variation of the latency in milliseconds (overrides the profile)')
+    parser.add_argument('--net-path', type=parse_net_override, action='append', default=[], metavar='PREFIX=PROFILE',
+                        help='Use a different profile (or "off") for paths under PREFIX; repeatable, longest prefix wins')
+    parser.add_argument('--synth-output', default=SYNTH_OUTPUT,
+                        help=f'Where {SYNTH_PATH} stores synthesized segments, relative to the served '
+                             f'directory (default: {SYNTH_OUTPUT})')
+    args = parser.parse_args()
+    port = args.port
+
+    net_profile = args.net
+    custom = {'latency': args.net_latency, 'jitter': args.net_jitter, 'bandwidth': args.net_bandwidth}
+    if any(value is not None for value in custom.values()):
+        net_profile = dict(net_profile or {})
+        if args.net_latency is not None:
+            net_profile['latency'] = args.net_latency / 1000
+        if args.net_jitter is not None:
+            net_profile['jitter'] = args.net_jitter / 1000
+        if args.net_bandwidth is not None:
+            net_profile['bandwidth'] = args.net_bandwidth * 1000 / 8
+
+    # Get WSL IP
+    try:
+        wsl_ip = subprocess.check_output(['hostname', '-I']).decode().strip().split()[0]
+    except:
+        wsl_ip = "WSL IP not found"
+
+    # Get Windows host IP (usually the default gateway in WSL2)
+    try:
+        windows_ip = subprocess.check_output(['ip', 'route', 'show']).decode()
+        windows_ip = windows_ip.split('default via ')[1].split()[0]
+    except:
+        windows_ip = "Windows IP not found"
+
+    print("\n🚀 TechFlix Server Starting...\n")
+    print(f"Server will run on port {port}")
+    print(f"Serving directory: {os.path.abspath(DIRECTORY)}")
+    print(f"Metrics endpoint: http://localhost:{port}{METRICS_PATH}")
+    if net_profile or args.net_path:
+        print(f"Network emulation: {describe_net_profile(net_profile)}")
+        for prefix, profile in args.net_path:
+            print(f"  {prefix}: {describe_net_profile(profile)}")
+    print()
+    print("=" * 50)
+    print("Access TechFlix from Windows browser at:")
+    print(f"  http://localhost:{port}")
+    print(f"  http://127.0.0.1:{port}")
+    print(f"  http://{wsl_ip}:{port}")
+    print("\nIf localhost doesn't work in Windows:")
+    print("1. Try the WSL IP address directly")
+    print("2. Check Windows Firewall settings")
+    print("3. Run this PowerShell command as Admin:")
+    print(f"   netsh interface portproxy add v4tov4 listenport={port} listenaddress=0.0.0.0 connectport={port} connectaddress={wsl_ip}")
+    print("=" * 50)
+    print("\nPress Ctrl+C to stop the server\n")
+
+    with TechFlixServer(("0.0.0.0", port), Handler) as httpd:
+        httpd.preload_segments = args.preload_segments
+        httpd.early_hints = args.early_hints
+        httpd.net_profile = net_profile
+        httpd.net_overrides = args.net_path
+        httpd.synth_output = os.path.join(os.path.abspath(DIRECTORY), args.synth_output)
+        try:
+            httpd.serve_forever()
+        finally:
+            ACCESS_LOG.flush()
+
+if __name__ == "__main__":
+    main()
@@ -285,12 +285,7 @@ class AudioManager {
     if (!episodeId) { logger.error('loadEpisodeAudio: episodeId is required'); return false; }
     try {
       logger.info('Loading episode audio', { episodeId });
-      const voResponse = await fetch(`/audio/voiceovers/${episodeId}/metadata.json`);
-      if (!voResponse.ok) throw new Error(`Failed to fetch voiceover metadata: ${voResponse.statusText}`);
-      const voiceoverMeta = await voResponse.json();
-      const fxResponse = await fetch(`/audio/effects/${episodeId}/sound-library.json`);
-      if (!fxResponse.ok) throw new Error(`Failed to fetch sound effects library: ${fxResponse.statusText}`);
-      const effectsLibrary = await fxResponse.json();
+      const { voiceoverMeta, effectsLibrary } = await this.fetchEpisodeAudioDocuments(episodeId);
       this.episodeAudioData.metadata = { voiceovers: voiceoverMeta, effects: effectsLibrary };
       if (voiceoverMeta.segments) await this.preloadEpisodeVoiceovers(episodeId, voiceoverMeta.segments);
       if (effectsLibrary.effects) await this.preloadEpisodeEffects(episodeId, effectsLibrary.effects);
@@ -302,6 +297,24 @@ class AudioManager {
     }
   }
 
+  async fetchEpisodeAudioDocuments(episodeId) {
+    // The dev/WSL server merges both documents into one response; other hosts only serve the static files
+    try {
+      const bundleResponse = await fetch(`/api/episodes/${episodeId}/audio-bundle`);
+      if (bundleResponse.ok) {
+        const bundle = await bundleResponse.json();
+        if (bundle.voiceovers && bundle.effects) return { voiceoverMeta: bundle.voiceovers, effectsLibrary: bundle.effects };
+      }
+    } catch (error) { logger.debug('Episode audio bundle unavailable, using separate requests', { episodeId, error: error.message }); }
+    const [voResponse, fxResponse] = await Promise.all([
+      fetch(`/audio/voiceovers/${episodeId}/metadata.json`),
+      fetch(`/audio/effects/${episodeId}/sound-library.json`)
+    ]);
+    if (!voResponse.ok) throw new Error(`Failed to fetch voiceover metadata: ${voResponse.statusText}`);
+    if (!fxResponse.ok) throw new Error(`Failed to fetch sound effects library: ${fxResponse.statusText}`);
+    return { voiceoverMeta: await voResponse.json(), effectsLibrary: await fxResponse.json() };
+  }
+
   async preloadEpisodeVoiceovers(episodeId, segments) {
     const promises = segments.map(async (segment) => {
       if (!segment.id || !segment.file) { logger.warn('Invalid segment data for preloadEpisodeVoiceovers', { segment }); return; }